@@ -8,6 +8,20 @@ from . import admin
 config = conf.config
 register = conf.register
 reload_maybe = conf.reload_maybe
+areload_maybe = conf.areload_maybe
+stats = conf.stats
+preload = conf.preload
+prefork = conf.prefork
+frozen = conf.frozen
 
 __version__ = "0.11.0"
-__all__ = ['config', 'register', 'reload_maybe', 'admin']
+__all__ = [
+    'config',
+    'register',
+    'reload_maybe',
+    'areload_maybe',
+    'stats',
+    'preload',
+    'prefork',
+    'frozen',
+    'admin']
@@ -0,0 +1,554 @@
+# -*- coding: utf-8 -*-
+
+"""
+Backends telling every process the config has changed.
+
+The middleware asks the backends for the current config\
+version on every request, in the order they are set in\
+``settings.DJCONFIG_BACKENDS``. The first backend knowing\
+the version answers, the database is queried\
+(:py:class:`PollBackend`) if none does. Saving a config\
+form publishes the new version to every backend.
+
+Usage::
+
+    # settings.py
+
+    DJCONFIG_BACKENDS = [
+        'djconfig.backends.NotifyBackend',
+    ]
+"""
+
+from __future__ import unicode_literals
+import os
+import select
+import logging
+import tempfile
+import threading
+import queue
+import contextvars
+
+from asgiref.sync import sync_to_async
+import django
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections, models
+from django.db.models import Value
+from django.utils.module_loading import import_string
+
+__all__ = [
+    'BaseBackend',
+    'PollBackend',
+    'CacheBackend',
+    'FileBackend',
+    'LocalBackend',
+    'NotifyBackend',
+    'BaseTransport',
+    'PostgresTransport',
+    'LocalTransport',
+    'get_backends',
+    'get_db_version',
+    'get_db_changes']
+
+logger = logging.getLogger(__name__)
+
+_CACHE_KEY = 'djconfig:version'
+
+
+def get_db_version():
+    """
+    Return the config version stored in the database,\
+    or zero if the config was never saved
+    """
+    ConfigVersion = apps.get_model('djconfig.ConfigVersion')
+    version = (
+        ConfigVersion.objects
+            .filter(pk=1)
+            .values_list('version', flat=True)
+            .first())
+    return version or 0
+
+
+def _changes_query(since):
+    """
+    Return a query of the config version and the config\
+    rows saved after a given version, in a single round trip.\
+    The version row is the one with a ``None`` key
+    """
+    ConfigModel = apps.get_model('djconfig.Config')
+    ConfigVersion = apps.get_model('djconfig.ConfigVersion')
+    version = (
+        ConfigVersion.objects
+            .filter(pk=1)
+            .annotate(
+                key=Value(None, output_field=models.CharField()),
+                value=Value(None, output_field=models.TextField()))
+            .values_list('version', 'key', 'value'))
+    rows = (
+        ConfigModel.objects
+            .filter(version__gt=since)
+            .values_list('version', 'key', 'value'))
+    return version.union(rows, all=True)
+
+
+def _split_changes(result):
+    version = 0
+    rows = []
+    for row_version, key, value in result:
+        if key is None:
+            version = row_version
+        else:
+            rows.append((key, value, row_version))
+    return version, rows
+
+
+def get_db_changes(since):
+    """
+    Return the config version and the config\
+    rows saved after a given version
+
+    :param int since: A config version
+    :return: The version, and a list of ``(key, value, version)``
+    """
+    return _split_changes(_changes_query(since))
+
+
+class BaseBackend(object):
+    """
+    Base class for every backend.
+
+    Versions are integers incremented on every\
+    save, zero means the config was never saved
+    """
+    #: Whether getting the version queries the database
+    hit_db = False
+
+    def get_version(self):
+        """
+        Return the current config version
+
+        :return: The version or ``None`` if it's unknown
+        """
+        return None
+
+    async def aget_version(self):
+        """
+        Async version of :py:meth:`get_version`
+        """
+        return self.get_version()
+
+    def set_version(self, version):
+        """
+        Store a version read from another backend.\
+        It must not replace the current one, since\
+        it may be older than a published one
+        """
+
+    async def aset_version(self, version):
+        """
+        Async version of :py:meth:`set_version`
+        """
+        self.set_version(version)
+
+    def publish(self, version):
+        """
+        Publish a new version. This is\
+        called once the config is saved
+        """
+
+    def stop(self):
+        """
+        Release the resources of the backend
+        """
+
+
+class PollBackend(BaseBackend):
+    """
+    Query the database. This is always\
+    the last backend, even when not set
+    """
+    hit_db = True
+
+    def get_version(self):
+        return get_db_version()
+
+    async def aget_version(self):
+        # Django < 4.1 has no async ORM
+        if django.VERSION < (4, 1):
+            return await sync_to_async(self.get_version)()
+
+        ConfigVersion = apps.get_model('djconfig.ConfigVersion')
+        version = await (
+            ConfigVersion.objects
+                .filter(pk=1)
+                .values_list('version', flat=True)
+                .afirst())
+        return version or 0
+
+    def get_changes(self, since):
+        """
+        Return the version and the rows saved after\
+        a given version. This is used instead of\
+        :py:meth:`get_version` once the config is loaded,\
+        so checking the version and loading the changes\
+        is a single query
+
+        :param int since: A config version
+        :return: The version, and a list of ``(key, value, version)``
+        """
+        return get_db_changes(since)
+
+    async def aget_changes(self, since):
+        """
+        Async version of :py:meth:`get_changes`
+        """
+        # Django < 4.1 has no async ORM
+        if django.VERSION < (4, 1):
+            return await sync_to_async(self.get_changes)(since)
+
+        return _split_changes([
+            row async for row in _changes_query(since)])
+
+
+class CacheBackend(BaseBackend):
+    """
+    Store the version into the django cache\
+    set in ``settings.DJCONFIG_CACHE``
+    """
+    def __init__(self):
+        self.cache = caches[settings.DJCONFIG_CACHE]
+
+    def get_version(self):
+        return self.cache.get(_CACHE_KEY)
+
+    async def aget_version(self):
+        # Django < 4.0 has no async cache
+        if django.VERSION < (4, 0):
+            return await sync_to_async(self.get_version)()
+
+        return await self.cache.aget(_CACHE_KEY)
+
+    def set_version(self, version):
+        self.cache.add(_CACHE_KEY, version, timeout=None)
+
+    async def aset_version(self, version):
+        # Django < 4.0 has no async cache
+        if django.VERSION < (4, 0):
+            return await sync_to_async(self.set_version)(version)
+
+        await self.cache.aadd(_CACHE_KEY, version, timeout=None)
+
+    def publish(self, version):
+        self.cache.set(_CACHE_KEY, version, timeout=None)
+
+
+def _write_version_file(path, version, replace=True):
+    """
+    Write the version into the version file.\
+    It's written into a temporary file first and then\
+    renamed, so readers never see a partially written file
+
+    :param bool replace: Replace the current file
+    """
+    try:
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(path)),
+            prefix='.djconfig')
+    except OSError as err:
+        logger.warning('The version file could not be written: %s', err)
+        return
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as fh:
+            fh.write(str(version))
+        if replace:
+            os.replace(tmp_path, path)
+        else:
+            # Fails if the file exists
+            os.link(tmp_path, path)
+    except OSError as err:
+        if replace:
+            logger.warning('The version file could not be written: %s', err)
+    finally:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+
+
+class FileBackend(BaseBackend):
+    """
+    Store the version into the host-local file\
+    set in ``settings.DJCONFIG_VERSION_FILE``.\
+    The file is only read if it has changed\
+    since last time, which is told by ``os.stat``
+    """
+    def __init__(self):
+        self.path = settings.DJCONFIG_VERSION_FILE
+        self._seen = None, None
+
+    def get_version(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        seen_signature, version = self._seen
+        if signature == seen_signature:
+            return version
+        try:
+            with open(self.path, encoding='utf-8') as fh:
+                version = int(fh.read())
+        except OSError:
+            return None
+        except ValueError:
+            # Not a version (ie: written by a previous release),
+            # it's written again from the database version
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            return None
+        self._seen = signature, version
+        return version
+
+    def set_version(self, version):
+        _write_version_file(self.path, version, replace=False)
+
+    def publish(self, version):
+        _write_version_file(self.path, version)
+
+
+class LocalBackend(BaseBackend):
+    """
+    Keep the version in memory, the database is queried\
+    only once. Only saves made by the current process\
+    are seen, so this is meant for single process set ups
+    """
+    def __init__(self):
+        self.version = None
+
+    def get_version(self):
+        return self.version
+
+    def set_version(self, version):
+        if self.version is None:
+            self.version = version
+
+    def publish(self, version):
+        self.version = version
+
+
+class BaseTransport(object):
+    """
+    Base class for the :py:class:`NotifyBackend` transports
+    """
+    def publish(self, version):
+        """
+        Send the version to every listener.\
+        Versions are sent as strings
+        """
+        raise NotImplementedError()
+
+    def listen(self, callback, ready, stopped):
+        """
+        Call ``callback`` with every received version,\
+        until ``stopped`` is set. This blocks, and it's\
+        called in a background thread
+
+        :param callback: Function to call with each version
+        :param ready: Function to call once listening
+        :param stopped: A ``threading.Event``
+        """
+        raise NotImplementedError()
+
+
+class PostgresTransport(BaseTransport):
+    """
+    PostgreSQL ``LISTEN``/``NOTIFY``. The channel name\
+    is set in ``settings.DJCONFIG_NOTIFY_CHANNEL``\
+    (``'djconfig'`` by default)
+    """
+    #: Seconds to wait for notifications before checking if stopped
+    timeout = 5
+
+    def __init__(self):
+        self.channel = getattr(
+            settings, 'DJCONFIG_NOTIFY_CHANNEL', 'djconfig')
+
+    def publish(self, version):
+        with connections['default'].cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [self.channel, version])
+
+    def listen(self, callback, ready, stopped):
+        # A thread-local connection, just for this thread
+        connection = connections['default']
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'LISTEN %s' % connection.ops.quote_name(self.channel))
+            ready()
+            raw = connection.connection
+            while not stopped.is_set():
+                if hasattr(raw, 'poll'):  # psycopg2
+                    if select.select([raw], [], [], self.timeout)[0]:
+                        raw.poll()
+                        while raw.notifies:
+                            callback(raw.notifies.pop(0).payload)
+                else:  # psycopg 3
+                    for notify in raw.notifies(timeout=self.timeout):
+                        callback(notify.payload)
+        finally:
+            connection.close()
+
+
+class LocalTransport(BaseTransport):
+    """
+    In-process transport, meant for testing
+    """
+    _listeners = []
+    _lock = threading.Lock()
+
+    def publish(self, version):
+        with self._lock:
+            for listener in self._listeners:
+                listener.put(version)
+
+    def listen(self, callback, ready, stopped):
+        listener = queue.Queue()
+        with self._lock:
+            self._listeners.append(listener)
+        try:
+            ready()
+            while not stopped.is_set():
+                try:
+                    callback(listener.get(timeout=0.1))
+                except queue.Empty:
+                    pass
+        finally:
+            with self._lock:
+                self._listeners.remove(listener)
+
+
+class NotifyBackend(BaseBackend):
+    """
+    Versions are pushed to every process and\
+    consumed by a background listener, so getting\
+    the version does no I/O. The transport is set in\
+    ``settings.DJCONFIG_NOTIFY_TRANSPORT``\
+    (:py:class:`PostgresTransport` by default).
+
+    The version is unknown (so the next backend is asked)\
+    until the listener is ready, and after it disconnects,\
+    since notifications may have been missed. A version\
+    from the next backend is only kept if it was read\
+    once listening, since it may be older than a\
+    notification sent before
+    """
+    #: Seconds to wait before reconnecting
+    retry_delay = 1
+
+    def __init__(self):
+        self.transport = import_string(getattr(
+            settings,
+            'DJCONFIG_NOTIFY_TRANSPORT',
+            'djconfig.backends.PostgresTransport'))()
+        self.version = None
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        # Incremented every time the listener is ready
+        self._generation = 0
+        # The generation seen by the caller
+        # when the version was unknown
+        self._asked = contextvars.ContextVar(
+            'djconfig_notify_asked', default=None)
+
+    def _start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._listen, name='djconfig-listener', daemon=True)
+            self._thread.start()
+
+    def _listen(self):
+        while not self._stopped.is_set():
+            try:
+                self.transport.listen(
+                    self._received, self._set_ready, self._stopped)
+            # Any error (ie: the driver's own errors) must not
+            # kill the thread, or the version would never change
+            except Exception:
+                logger.exception('The config listener disconnected')
+            finally:
+                with self._lock:
+                    self._ready.clear()
+                    self.version = None
+            self._stopped.wait(self.retry_delay)
+
+    def _set_ready(self):
+        with self._lock:
+            self._generation += 1
+            self._ready.set()
+
+    def _received(self, version):
+        try:
+            version = int(version)
+        except ValueError:
+            logger.warning('Not a config version: %r', version)
+            return
+        with self._lock:
+            self.version = version
+
+    def get_version(self):
+        if self._thread is None:
+            self._start()
+        if not self._ready.is_set():
+            self._asked.set(None)
+            return None
+        generation = self._generation
+        version = self.version
+        if version is None:
+            # A version read from now on is not
+            # older than the listened notifications
+            self._asked.set(generation)
+        return version
+
+    def set_version(self, version):
+        with self._lock:
+            if (self._ready.is_set() and
+                    self.version is None and
+                    self._asked.get() == self._generation):
+                self.version = version
+
+    def publish(self, version):
+        self.transport.publish(str(version))
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def get_backends():
+    """
+    Create the backends set in ``settings.DJCONFIG_BACKENDS``.\
+    If it's not set, the file and cache backends are used\
+    if their settings are set. The :py:class:`PollBackend`\
+    is added at the end if it's missing
+
+    :return: A list of backends
+    """
+    paths = getattr(settings, 'DJCONFIG_BACKENDS', None)
+    if paths is None:
+        paths = []
+        if getattr(settings, 'DJCONFIG_VERSION_FILE', None):
+            paths.append('djconfig.backends.FileBackend')
+        if getattr(settings, 'DJCONFIG_CACHE', None):
+            paths.append('djconfig.backends.CacheBackend')
+    backends = [import_string(path)() for path in paths]
+    if not any(isinstance(backend, PollBackend) for backend in backends):
+        backends.append(PollBackend())
+    return backends
@@ -2,17 +2,53 @@
 
 from __future__ import unicode_literals
 import json
+import time
+import datetime
+import decimal
+import hashlib
+import threading
+import collections
+import contextlib
+import contextvars
+import logging
+import os
+import gc
+import pickle
+import tempfile
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from asgiref.sync import sync_to_async
 from django.apps import apps
 from django import forms
-from django.db import models
+from django.db import (
+    models, connection, connections, DatabaseError, close_old_connections)
 from django.conf import settings
+from django.core.exceptions import (
+    ValidationError, SynchronousOnlyOperation, EmptyResultSet)
+from django.core.cache import caches
+from django.utils.functional import Promise
+
+from django.core.signals import setting_changed
+
+from . import signals
+from . import backends
 
 __all__ = [
     "Config",
     "config",
     "register",
-    "register"]
+    "reload_maybe",
+    "areload_maybe",
+    "stats",
+    "preload",
+    "prefork",
+    "frozen"]
+
+logger = logging.getLogger(__name__)
 
 
 class _ConfigFormBase(forms.Form):
@@ -44,17 +80,492 @@ def _check_backend():
         "is required but it was not found in "
         "MIDDLEWARE_CLASSES nor in MIDDLEWARE")
 
+def _get_cache():
+    """
+    Return the cache set in ``settings.DJCONFIG_CACHE``\
+    or ``None`` if it's not set
+    """
+    alias = getattr(settings, 'DJCONFIG_CACHE', None)
+    if not alias:
+        return None
+    return caches[alias]
+
+
+_PACKED_KEY = '_packed'
+
+
+def _is_packed():
+    """
+    Tell whether the whole config is stored into\
+    a single row (``settings.DJCONFIG_STORAGE = 'packed'``)\
+    instead of a row per key (``'rows'``, the default)
+    """
+    return getattr(settings, 'DJCONFIG_STORAGE', 'rows') == 'packed'
+
+
+def _pack(data):
+    return json.dumps(data, separators=(',', ':'), sort_keys=True)
+
+
+def _unpack(value):
+    return json.loads(value) if value else {}
+
+
+def _rows_data(rows):
+    """
+    Return the key/values of the given config rows.\
+    The packed row is the whole config in packed storage,\
+    the other rows are ignored, and the other way around
+
+    :param rows: A list of ``(key, value, version)``
+    :return: A dict of key and value, or ``None``\
+    if the rows contain no config (packed storage)
+    """
+    if _is_packed():
+        for key, value, _ in rows:
+            if key == _PACKED_KEY:
+                return _unpack(value)
+        return None
+    return {
+        key: value
+        for key, value, _ in rows
+        if key != _PACKED_KEY}
+
+
+def _snapshot_enabled():
+    return (
+        getattr(settings, 'DJCONFIG_SNAPSHOT', False) and
+        _get_cache() is not None)
+
+
+_SNAPSHOT_FILE_HEADER = 'djconfig:1:%s\n'
+
+
+def _snapshot_file():
+    return getattr(settings, 'DJCONFIG_SNAPSHOT_FILE', None)
+
+
+def _read_snapshot_file(path, key):
+    """
+    Read the snapshot file. The header contains\
+    the snapshot key, so the snapshot is only\
+    decoded if it's the expected one
+
+    :return: The snapshot or ``None`` if it's\
+    missing, corrupted or not the expected one
+    """
+    header = (_SNAPSHOT_FILE_HEADER % key).encode('ascii')
+    try:
+        with open(path, 'rb') as fh:
+            if fh.read(len(header)) != header:
+                return None
+            try:
+                return pickle.load(fh)
+            except (EOFError, pickle.UnpicklingError):
+                return None
+            # ie: a form or model renamed since it was written
+            except Exception as err:
+                logger.warning(
+                    'The config snapshot could not be read: %r', err)
+                return None
+    except OSError:
+        return None
+
+
+def _write_snapshot_file(path, key, cache):
+    """
+    Write the snapshot file. It's written into\
+    a temporary file first and then renamed,\
+    so readers never see a partially written file
+    """
+    header = (_SNAPSHOT_FILE_HEADER % key).encode('ascii')
+    try:
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(path)),
+            prefix='.djconfig')
+    except OSError as err:
+        logger.warning('The config snapshot could not be written: %s', err)
+        return
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(header)
+            pickle.dump(cache, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except (OSError, pickle.PicklingError) as err:
+        logger.warning('The config snapshot could not be written: %s', err)
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+
+
+@contextlib.contextmanager
+def _snapshot_file_lock():
+    """
+    Hold a host-wide lock, so a single process\
+    at a time rebuilds the snapshot file
+    """
+    path = _snapshot_file()
+    if not path or fcntl is None:
+        yield
+        return
+    with open(path + '.lock', 'a') as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
 def _deserialize(value, field):
     assert isinstance(field, forms.Field)
     if isinstance(field, forms.ModelMultipleChoiceField):
         return json.loads(value)
     return value
 
+_TYPED_PREFIX = 'djconfig+json:'
+
+_DECODERS = {
+    'none': lambda value: None,
+    'bool': bool,
+    'int': int,
+    'float': float,
+    'str': str,
+    'decimal': decimal.Decimal,
+    'date': datetime.date.fromisoformat,
+    'datetime': datetime.datetime.fromisoformat,
+    'time': datetime.time.fromisoformat}
+
+
+def _is_typed(value):
+    return isinstance(value, str) and value.startswith(_TYPED_PREFIX)
+
+
+def _decode_value(typed, field):
+    kind, value = typed['t'], typed['v']
+    if kind == 'list':
+        return [_decode_value(item, field) for item in value]
+    if kind in ('model', 'models'):
+        queryset = getattr(field, 'queryset', None)
+        if queryset is None:
+            raise ValidationError('%s is not a model field' % field)
+        if kind == 'models':
+            return list(queryset.filter(pk__in=value))
+        try:
+            return queryset.get(pk=value)
+        except queryset.model.DoesNotExist:
+            raise ValidationError('The instance does not exist')
+    return _DECODERS[kind](value)
+
+
+def _decode(value, field):
+    """
+    Decode a value encoded with\
+    ``settings.DJCONFIG_TYPED_ENCODING``,\
+    see :py:func:`djconfig.utils.serialize`.\
+    The value was cleaned when saved, so\
+    it's not validated. Model instances\
+    are queried by primary key
+
+    :raises ValidationError: If the value\
+    is malformed, or the instance is not found
+    """
+    assert isinstance(field, forms.Field)
+    try:
+        return _decode_value(
+            json.loads(value[len(_TYPED_PREFIX):]), field)
+    except (ValueError, TypeError, KeyError) as err:
+        raise ValidationError(str(err))
+
+
 def _unlazify(value):
     if isinstance(value, models.QuerySet):
         return list(value)
     return value
 
+
+_FormSchema = collections.namedtuple(
+    '_FormSchema', ['fields', 'use_form'])
+_FieldSchema = collections.namedtuple(
+    '_FieldSchema', ['name', 'field', 'initial', 'is_file'])
+
+# Form methods that may change the fields or cleaned values
+_FORM_HOOKS = frozenset([
+    '__init__', 'clean', 'full_clean', '_clean_fields', '_clean_form',
+    '_post_clean'])
+
+
+def _fingerprint(value):
+    """
+    Represent a field attribute the same way\
+    in every process (ie: no memory addresses)
+    """
+    if isinstance(value, Promise):
+        return repr(str(value))
+    if isinstance(value, (list, tuple)):
+        return '[%s]' % ', '.join(_fingerprint(v) for v in value)
+    if isinstance(value, dict):
+        return '{%s}' % ', '.join(sorted(
+            '%s: %s' % (_fingerprint(k), _fingerprint(v))
+            for k, v in value.items()))
+    # functions and classes
+    if hasattr(value, '__qualname__'):
+        return '%s.%s' % (value.__module__, value.__qualname__)
+    # ie: validators
+    if hasattr(value, 'deconstruct'):
+        return _fingerprint(value.deconstruct())
+    if type(value).__repr__ is object.__repr__:
+        return _fingerprint(type(value))
+    return repr(value)
+
+
+def _field_fingerprint(name, field):
+    """
+    Represent a field definition, so snapshots built\
+    with a different definition (ie: another initial\
+    value, before a deploy) are not loaded
+    """
+    parts = [
+        name,
+        type(field),
+        field.initial,
+        field.required,
+        field.disabled,
+        field.validators]
+    if isinstance(field, forms.ModelChoiceField):
+        parts.append(field.queryset.model._meta.label)
+        # The SQL is compiled, not run
+        try:
+            parts.append(str(field.queryset.query))
+        except EmptyResultSet:
+            pass
+    elif isinstance(field, forms.ChoiceField):
+        parts.append(field.choices)
+    return _fingerprint(parts)
+
+
+def _has_hooks(form_class):
+    """
+    Check whether a form class (or any of its\
+    parents up to :py:class:`djconfig.forms.ConfigForm`)\
+    changes its fields or cleaned values
+    """
+    for klass in form_class.__mro__:
+        if klass is _ConfigFormBase:
+            return False
+        if klass.__module__.split('.')[0] == 'djconfig':
+            continue
+        for name in vars(klass):
+            if name in _FORM_HOOKS or name.startswith('clean_'):
+                return True
+    return False
+
+
+def _compile_form(form_class):
+    """
+    Compile the field schema of a form class,\
+    so loading it does not require to build\
+    the form. Forms with hooks are built regardless
+
+    :param object form_class: A config form class
+    :return: The form schema
+    """
+    return _FormSchema(
+        fields=tuple(
+            _FieldSchema(
+                name=name,
+                field=field,
+                initial=field.initial,
+                is_file=isinstance(field, forms.FileField))
+            for name, field in form_class.base_fields.items()),
+        use_form=_has_hooks(form_class))
+
+
+def _clean_field(field_schema, value):
+    """
+    Clean a single database value the\
+    same way the form would do it
+
+    :return: The cleaned value
+    :raises ValidationError: If the value is not valid
+    """
+    field = field_schema.field
+    if _is_typed(value):
+        return _decode(value, field)
+    name = field_schema.name
+    value = field.widget.value_from_datadict(
+        {name: _deserialize(value, field)}, {}, name)
+    return _unlazify(field.clean(value))
+
+
+@contextlib.contextmanager
+def _measure():
+    """
+    Measure the duration and number\
+    of database queries of a block
+    """
+    measure = {'duration': 0, 'queries': 0}
+
+    def count(execute, sql, params, many, context):
+        measure['queries'] += 1
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    with connection.execute_wrapper(count):
+        yield measure
+    measure['duration'] = time.perf_counter() - start
+
+
+def _changed_keys(old, new):
+    missing = object()
+    return [
+        key
+        for key, value in new.items()
+        if old.get(key, missing) != value]
+
+
+class _LazyValue(object):
+    """
+    A database value cleaned on first access.\
+    The cleaned value is memoized, so it's\
+    cleaned once per config version
+    """
+    __slots__ = ('value', 'cleaned')
+
+    _empty = object()
+
+    def __init__(self, value):
+        self.value = value
+        self.cleaned = self._empty
+
+    # A tuple, so __setstate__ is
+    # called for falsy values too
+    def __getstate__(self):
+        return (self.value,)
+
+    def __setstate__(self, state):
+        self.value, = state
+        self.cleaned = self._empty
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, _LazyValue) and
+            self.value == other.value)
+
+    __hash__ = None
+
+    def resolve(self, field_schema):
+        if self.cleaned is self._empty:
+            try:
+                self.cleaned = _clean_field(field_schema, self.value)
+            except ValidationError:
+                self.cleaned = field_schema.initial
+        return self.cleaned
+
+
+class _FrozenConfig(object):
+    """
+    Base class of the compiled configs,\
+    see :py:func:`_compile_config`
+    """
+    __slots__ = ()
+
+    def __getattr__(self, key):
+        # Only called for missing keys
+        raise AttributeError('Attribute "%s" not found in config.' % key)
+
+    def __setattr__(self, key, value):
+        raise AttributeError('The config is read-only.')
+
+    def __delattr__(self, key):
+        raise AttributeError('The config is read-only.')
+
+
+# Slot holding the lazy values and their field schema
+_LAZY_SLOT = '_djconfig_lazy'
+
+# Compiled config classes, by key set
+_frozen_classes = {}
+
+
+def _resolve_lazy(frozen, key):
+    value, field_schema = getattr(frozen, _LAZY_SLOT)[key]
+    return value.resolve(field_schema)
+
+
+def _frozen_class(keys, lazy_keys):
+    """
+    Return the class of the compiled configs with\
+    the given keys. A class is generated once per\
+    key set, which rarely changes, not once per version
+    """
+    try:
+        return _frozen_classes[keys, lazy_keys]
+    except KeyError:
+        pass
+    attrs = {'__slots__': tuple(
+        key
+        for key in keys
+        if key not in lazy_keys)}
+    if lazy_keys:
+        attrs['__slots__'] += (_LAZY_SLOT,)
+    for key in lazy_keys:
+        attrs[key] = property(
+            lambda self, key=key: _resolve_lazy(self, key))
+    frozen_class = type(str('FrozenConfig'), (_FrozenConfig,), attrs)
+    return _frozen_classes.setdefault((keys, lazy_keys), frozen_class)
+
+
+def _compile_config(cache, field_schemas):
+    """
+    Compile a cache into an immutable object.\
+    The class has a slot per key, so reading\
+    a value is a plain slot read. Lazy values\
+    are properties, resolved on first access
+    """
+    lazy_keys = tuple(
+        key
+        for key, value in cache.items()
+        if isinstance(value, _LazyValue))
+    frozen_class = _frozen_class(tuple(cache), lazy_keys)
+    frozen = frozen_class()
+    for key, value in cache.items():
+        if key not in lazy_keys:
+            object.__setattr__(frozen, key, value)
+    if lazy_keys:
+        object.__setattr__(frozen, _LAZY_SLOT, {
+            key: (cache[key], field_schemas[key])
+            for key in lazy_keys})
+    return frozen
+
+
+# Whether the version check of the current request
+# is deferred until the config is first accessed
+_deferred_check = contextvars.ContextVar(
+    'djconfig_deferred_check', default=False)
+
+
+def _call_in_background(func, *args, **kwargs):
+    """
+    Call a reload function from a background thread.\
+    The database connections of the thread are handled\
+    like the ones of a request, and errors are logged,\
+    since there is no request to fail
+    """
+    close_old_connections()
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        logger.exception('The config could not be reloaded')
+    finally:
+        close_old_connections()
+
+
+def _is_lazy(field_schema):
+    return (
+        getattr(settings, 'DJCONFIG_LAZY_MODELS', False) and
+        isinstance(field_schema.field, forms.ModelChoiceField))
+
 class Config(object):
     """
     Contain registry of config forms and\
@@ -68,6 +579,25 @@ class Config(object):
     def __init__(self):
         self._registry = set()
         self._cache = {}
+        self._checked_at = None
+        self._reload_lock = threading.Lock()
+        self._schemas = {}
+        self._field_schemas = {}
+        self._fields = {}
+        self._data = None
+        self._data_version = None
+        self._changes = None
+        self._form_durations = {}
+        self._counters = collections.Counter()
+        self._backends = None
+        self._refresher = None
+        self._refresher_lock = threading.Lock()
+        self._stale_since = None
+        self._revalidator = None
+        self._revalidate_lock = threading.Lock()
+        self._frozen_config = None, None
+        # Set by the middleware from settings.DJCONFIG_LAZY_CHECK
+        self._lazy_check = False
 
     def __getattr__(self, key):
         """
@@ -75,10 +605,15 @@ class Config(object):
 
         :return: The cache value for the accessed key/attribute
         """
+        if self._lazy_check:
+            self._check_deferred()
         try:
-            return self._cache[key]
+            value = self._cache[key]
         except KeyError:
             raise AttributeError('Attribute "%s" not found in config.' % key)
+        if isinstance(value, _LazyValue):
+            return value.resolve(self._field_schemas[key])
+        return value
 
     def _register(self, form_class, check_middleware=True):
         """
@@ -95,82 +630,701 @@ class Config(object):
                 "The form does not inherit from `forms.ConfigForm`")
 
         self._registry.add(form_class)
+        self._schemas[form_class] = _compile_form(form_class)
+        self._field_schemas.update({
+            field_schema.name: field_schema
+            for field_schema in self._schemas[form_class].fields})
 
         if check_middleware:
             _check_backend()
 
-    def _reload(self):
+    def _load_form(self, form_class, data):
+        """
+        Get a registered form's field values.\
+        If a field name is found in the data, it will load it from there.\
+        Otherwise, the initial value from the field form is used.\
+        The values are cleaned field by field using the form\
+        schema, unless the form has hooks
+
+        :param object form_class: The registered form class
+        :param dict data: The database key-value rows
+        :return: The form's field-value
+        """
+        schema = self._schemas[form_class]
+        if schema.use_form:
+            return self._load_form_instance(form_class, data)
+
+        cache = {}
+        self._fields[form_class] = frozenset(
+            field_schema.name
+            for field_schema in schema.fields)
+
+        for field_schema in schema.fields:
+            name = field_schema.name
+            cache[name] = field_schema.initial
+            if name not in data or field_schema.field.disabled:
+                continue
+            # files don't need cleaning, see below
+            if field_schema.is_file:
+                cache[name] = data[name]
+                continue
+            # model fields are cleaned on first access
+            if _is_lazy(field_schema):
+                cache[name] = _LazyValue(data[name])
+                continue
+            try:
+                cache[name] = _clean_field(field_schema, data[name])
+            except ValidationError:
+                pass
+
+        return cache
+
+    def _load_form_instance(self, form_class, data):
+        """
+        Same as :py:meth:`_load_form`,\
+        except the values are cleaned by the form
+        """
+        cache = {}
+
+        # populate cache with initial form values,
+        # then with cleaned database values,
+        # then with raw database file/image paths
+        empty_form = form_class()
+        self._fields[form_class] = frozenset(empty_form.fields)
+        cache.update({
+            name: field.initial
+            for name, field in empty_form.fields.items()})
+        # typed values were cleaned by the form when saved
+        typed = {}
+        for name, field in empty_form.fields.items():
+            if name not in data or not _is_typed(data[name]):
+                continue
+            try:
+                typed[name] = _decode(data[name], field)
+            except ValidationError:
+                typed[name] = field.initial
+        form = form_class(data={
+            name: _deserialize(data[name], field)
+            for name, field in empty_form.fields.items()
+            if name in data and name not in typed and
+            not isinstance(field, forms.FileField)})
+        form.is_valid()
+        cache.update({
+            name: _unlazify(value)
+            for name, value in form.cleaned_data.items()
+            if name in data and name not in typed})
+        cache.update(typed)
+        # files are special because they don't have an initial value
+        # and the POSTED data must contain the file. So, we keep
+        # the stored path as is
+        # TODO: see if serialize/deserialize/unlazify can be used for this instead
+        cache.update({
+            name: data[name]
+            for name, field in empty_form.fields.items()
+            if name in data and isinstance(field, forms.FileField)})
+        return cache
+
+    def _load_forms(self, form_classes, data, cache):
+        """
+        Load the given forms into the cache,\
+        and keep the time each form took
+        """
+        durations = {}
+        for form_class in form_classes:
+            start = time.perf_counter()
+            cache.update(self._load_form(form_class, data))
+            durations[form_class] = time.perf_counter() - start
+        self._form_durations = durations
+
+    def _reload(self, version=None):
         """
         Gets every registered form's field value.\
         If a field name is found in the db, it will load it from there.\
         Otherwise, the initial value from the field form is used
+
+        :param int version: The config version,\
+        it's queried if not given
         """
         ConfigModel = apps.get_model('djconfig.Config')
+        # The rows are queried after the version, so
+        # they are never older than the version
+        if version is None:
+            version = backends.get_db_version()
         cache = {}
-        data = dict(
-            ConfigModel.objects
-                .all()
-                .values_list('key', 'value'))
+        rows = ConfigModel.objects.all()
+        if _is_packed():
+            rows = rows.filter(key=_PACKED_KEY)
+        rows = rows.values_list('key', 'value', 'version')
+        data = _rows_data(rows) or {}
+        self._load_forms(self._registry, data, cache)
+        cache['_version'] = version
+        self._data = data
+        self._data_version = max(
+            (row_version for _, _, row_version in rows if row_version),
+            default=None)
+        # Swap it in one go, so readers
+        # never see a partially built config
+        self._cache = cache
 
-        # populate cache with initial form values,
-        # then with cleaned database values,
-        # then with raw database file/image paths
-        for form_class in self._registry:
-            empty_form = form_class()
-            cache.update({
-                name: field.initial
-                for name, field in empty_form.fields.items()})
-            form = form_class(data={
-                name: _deserialize(data[name], field)
-                for name, field in empty_form.fields.items()
-                if name in data and not isinstance(field, forms.FileField)})
-            form.is_valid()
-            cache.update({
-                name: _unlazify(value)
-                for name, value in form.cleaned_data.items()
-                if name in data})
-            # files are special because they don't have an initial value
-            # and the POSTED data must contain the file. So, we keep
-            # the stored path as is
-            # TODO: see if serialize/deserialize/unlazify can be used for this instead
-            cache.update({
-                name: data[name]
-                for name, field in empty_form.fields.items()
-                if name in data and isinstance(field, forms.FileField)})
-
-        cache['_updated_at'] = data.get('_updated_at')
+        self._save_snapshot()
+
+    def _reload_changed(self, version):
+        """
+        Load the rows modified since the last reload,\
+        and re-validate only the forms containing them.\
+        This requires a previous :py:meth:`_reload`
+
+        :param int version: The config version
+
+        :return: Whether the changes were loaded.\
+        False if a full reload is required
+        """
+        if self._data is None or self._data_version is None:
+            return False
+
+        rows = self._fetched_changes(version)
+        if rows is None:
+            _, rows = backends.get_db_changes(self._data_version)
+
+        # The rows were modified without
+        # saving a form (ie: by hand)
+        if not rows:
+            return False
+
+        if _is_packed():
+            data = _rows_data(rows)
+            if data is None:
+                return False
+            changed = {
+                key
+                for key in set(data) | set(self._data)
+                if data.get(key) != self._data.get(key)}
+        else:
+            changed = _rows_data(rows)
+            data = dict(self._data, **changed)
+
+        if any(
+                form_class not in self._fields
+                for form_class in self._registry):
+            return False
+
+        cache = dict(self._cache)
+        self._load_forms(
+            [form_class
+             for form_class in self._registry
+             if not self._fields[form_class].isdisjoint(changed)],
+            data,
+            cache)
+        cache['_version'] = version
+        self._data = data
+        self._data_version = max(
+            row_version for _, _, row_version in rows)
+        self._cache = cache
+
+        self._save_snapshot()
+
+        return True
+
+    def _snapshot_key(self, version):
+        """
+        Return the cache key of the snapshot for a given\
+        version. The registered fields are part of the\
+        key, so processes running different forms\
+        (ie: while deploying) won't share snapshots
+        """
+        fields = sorted(
+            _field_fingerprint(name, field)
+            for form_class in self._registry
+            for name, field in form_class.base_fields.items())
+        digest = hashlib.md5(
+            '\n'.join([str(version)] + fields).encode('utf-8')).hexdigest()
+        return 'djconfig:snapshot:%s' % digest
+
+    def _save_snapshot(self):
+        """
+        Store the cache into ``settings.DJCONFIG_CACHE``\
+        and ``settings.DJCONFIG_SNAPSHOT_FILE``, if set,\
+        so other processes can load it instead of\
+        building it from the registered forms
+        """
+        version = self._cache.get('_version')
+        if not version:
+            return
+        key = self._snapshot_key(version)
+        if _snapshot_file():
+            _write_snapshot_file(_snapshot_file(), key, self._cache)
+        if _snapshot_enabled():
+            _get_cache().set(key, self._cache)
+
+    def _load_snapshot(self, version):
+        """
+        Load the cache stored by :py:meth:`_save_snapshot`.\
+        The host-local file is tried first
+
+        :return: Whether the snapshot was found
+        """
+        if not version:
+            return False
+        key = self._snapshot_key(version)
+        cache = None
+        if _snapshot_file():
+            cache = _read_snapshot_file(_snapshot_file(), key)
+        if cache is None and _snapshot_enabled():
+            cache = _get_cache().get(key)
+            if cache is not None and _snapshot_file():
+                _write_snapshot_file(_snapshot_file(), key, cache)
+        if cache is None:
+            return False
         self._cache = cache
+        self._data = None
+        return True
 
-    def _reload_maybe(self):
+    def _is_check_due(self):
+        """
+        Tell whether the version should be checked,\
+        this is always the case unless\
+        ``settings.DJCONFIG_CHECK_INTERVAL`` is set,\
+        in which case the check is done at most\
+        once every ``DJCONFIG_CHECK_INTERVAL`` seconds
+        """
+        interval = getattr(settings, 'DJCONFIG_CHECK_INTERVAL', 0)
+        return (
+            not interval or
+            self._checked_at is None or
+            time.monotonic() - self._checked_at >= interval)
+
+    def _reload_maybe(self, force=False):
         """
         Reload the config if the config\
         model has been updated. This is called\
         once on every request by the middleware.\
         Should not be called directly.
+
+        :param bool force: Check the config model\
+        even if ``settings.DJCONFIG_CHECK_INTERVAL``\
+        has not elapsed yet. Default False
         """
-        ConfigModel = apps.get_model('djconfig.Config')
+        if not force and not self._is_check_due():
+            self._counters['checks_skipped'] += 1
+            return
+
+        self._checked_at = time.monotonic()
+        start = time.perf_counter()
+        version, hit_db = self._get_version()
+        self._checked(start, version, hit_db)
+
+        if self._is_stale(version):
+            self._reload_stale(version)
+
+    async def _areload_maybe(self, force=False):
+        """
+        Async version of :py:meth:`_reload_maybe`.\
+        The version check does not block the event loop,\
+        reloading the config (if needed) is done in a thread
+
+        :param bool force: Check the config model\
+        even if ``settings.DJCONFIG_CHECK_INTERVAL``\
+        has not elapsed yet. Default False
+        """
+        if not force and not self._is_check_due():
+            self._counters['checks_skipped'] += 1
+            return
+
+        self._checked_at = time.monotonic()
+        start = time.perf_counter()
+        version, hit_db = await self._aget_version()
+        self._checked(start, version, hit_db)
+
+        if self._is_stale(version):
+            await sync_to_async(self._reload_stale)(version)
+
+    def _checked(self, start, version, hit_db):
+        duration = time.perf_counter() - start
+        self._counters['checks'] += 1
+        self._counters['checks_db'] += hit_db
+        self._counters['check_seconds'] += duration
+        signals.config_checked.send(
+            sender=self,
+            duration=duration,
+            version=version,
+            hit_db=hit_db,
+            stale=self._is_stale(version))
+
+    def _is_stale(self, version):
+        return (
+            not hasattr(self, '_version') or
+            self._version != version)
+
+    def _reload_stale(self, version):
+        """
+        Reload the config, but only in one thread at\
+        a time. Depending on ``settings.DJCONFIG_RELOAD_WAIT``,\
+        other threads will wait for the reload to finish\
+        (default) or keep using the current config.
+
+        If ``settings.DJCONFIG_STALE_WHILE_REVALIDATE`` is set,\
+        the config is reloaded in a background thread, and\
+        the current config is used meanwhile.
+
+        Threads wait regardless if there is no config yet,\
+        or if it's been stale for more than\
+        ``settings.DJCONFIG_MAX_STALENESS`` seconds
+        """
+        if self._stale_since is None:
+            self._stale_since = time.monotonic()
+
+        must_wait = self._is_too_stale()
+        if (not must_wait and
+                getattr(settings, 'DJCONFIG_STALE_WHILE_REVALIDATE', False)):
+            self._revalidate(version)
+            return
+
+        self._reload_locked(
+            version,
+            wait=must_wait or getattr(settings, 'DJCONFIG_RELOAD_WAIT', True))
+
+    def _is_too_stale(self):
+        """
+        Tell whether the current config can't be used\
+        while the new one is loaded. That's the case if\
+        there is no config yet or if it's been stale for\
+        more than ``settings.DJCONFIG_MAX_STALENESS`` seconds
+        """
+        if not hasattr(self, '_version'):
+            return True
+        max_staleness = getattr(settings, 'DJCONFIG_MAX_STALENESS', None)
+        return (
+            max_staleness is not None and
+            time.monotonic() - self._stale_since >= max_staleness)
+
+    def _reload_locked(self, version, wait=True):
+        if not self._reload_lock.acquire(wait):
+            return
+
+        try:
+            # Another thread may have reloaded it already
+            if self._is_stale(version):
+                self._measure_reload(self._refresh, version)
+            self._stale_since = None
+        finally:
+            self._reload_lock.release()
+
+    def _revalidate(self, version):
+        """
+        Reload the config in a background thread,\
+        unless it's being reloaded already
+        """
+        with self._revalidate_lock:
+            if self._revalidator is not None and self._revalidator.is_alive():
+                return
+            self._revalidator = threading.Thread(
+                target=_call_in_background,
+                args=(self._reload_locked, version),
+                name='djconfig-revalidate',
+                daemon=True)
+            self._revalidator.start()
+
+    def _refresh(self, version):
+        """
+        Load the config from the cheapest source
+
+        :return: The source name
+        """
+        # The changes were fetched along with the version
+        if (self._fetched_changes(version) is not None and
+                self._reload_changed(version)):
+            return 'changed'
+        if self._load_snapshot(version):
+            return 'snapshot'
+        with _snapshot_file_lock():
+            # Another process may have stored it while waiting
+            if _snapshot_file() and self._load_snapshot(version):
+                return 'snapshot'
+            if self._reload_changed(version):
+                return 'changed'
+            self._reload(version)
+            return 'full'
+
+    def _measure_reload(self, reload, *args):
+        """
+        Call the reload function, update the\
+        counters and send the reloaded signal
+
+        :param reload: A function returning the\
+        reload source, a full reload is assumed otherwise
+        """
+        old_cache = self._cache
+        self._form_durations = {}
+        with _measure() as measure:
+            source = reload(*args) or 'full'
+        self._counters['reloads'] += 1
+        self._counters['reloads_%s' % source] += 1
+        self._counters['reload_seconds'] += measure['duration']
+        signals.config_reloaded.send(
+            sender=self,
+            duration=measure['duration'],
+            queries=measure['queries'],
+            version=self._cache.get('_version'),
+            keys=_changed_keys(old_cache, self._cache),
+            source=source,
+            forms=self._form_durations)
+
+    def _preload(self):
+        """
+        Load the config ahead of the first request.\
+        It's safe to call when the database\
+        is not ready (ie: not migrated yet),\
+        the config is left to be loaded on\
+        the first request in that case
+
+        :return: Whether the config was loaded
+        """
+        try:
+            self._reload_maybe(force=True)
+        except (DatabaseError, SynchronousOnlyOperation) as err:
+            logger.warning('The config could not be preloaded: %s', err)
+            return False
+        return True
+
+    def _prefork(self):
+        """
+        Load the config in the master process of a\
+        pre-forking server, so the workers inherit it\
+        (copy-on-write) instead of loading it on their\
+        own. Workers will reload it only when it changes.
+
+        The database connections are closed, so they are not\
+        shared with the workers, and the objects are moved\
+        to the permanent garbage collector generation,\
+        so the collector does not copy the inherited memory
+
+        :return: Whether the config was loaded
+        """
+        loaded = self._preload()
+        connections.close_all()
+        gc.freeze()
+        return loaded
+
+    def _after_fork(self):
+        """
+        Reset the per-process state in a forked child.\
+        The lock may have been held by another thread\
+        of the parent process at the time of the fork.\
+        The backends and refresher threads are not\
+        running in the child, the refresher is started\
+        again if it was running in the parent
+        """
+        self._reload_lock = threading.Lock()
+        self._counters = collections.Counter()
+        self._backends = None
+        self._refresher_lock = threading.Lock()
+        self._revalidator = None
+        self._revalidate_lock = threading.Lock()
+        if self._refresher is not None:
+            self._refresher = None
+            self._start_refresher()
+
+    def _start_refresher(self):
+        """
+        Start a daemon thread checking the version\
+        every ``settings.DJCONFIG_REFRESH_INTERVAL``\
+        seconds, and reloading the config when it\
+        changes, so requests don't have to.\
+        This does nothing if the setting is not set,\
+        or if the thread is running already
+
+        :return: Whether the refresher is running
+        """
+        interval = getattr(settings, 'DJCONFIG_REFRESH_INTERVAL', 0)
+        if not interval:
+            return False
+        with self._refresher_lock:
+            if self._refresher is None:
+                stopped = threading.Event()
+                thread = threading.Thread(
+                    target=self._refresh_forever,
+                    args=(interval, stopped),
+                    name='djconfig-refresher',
+                    daemon=True)
+                self._refresher = thread, stopped
+                thread.start()
+        return True
+
+    def _refresh_forever(self, interval, stopped):
+        while not stopped.wait(interval):
+            _call_in_background(self._reload_maybe, force=True)
+
+    def _stop_refresher(self):
+        with self._refresher_lock:
+            refresher, self._refresher = self._refresher, None
+        if refresher is not None:
+            thread, stopped = refresher
+            stopped.set()
+            thread.join()
+
+    def _is_refreshed(self):
+        """
+        Tell whether the config is loaded and\
+        kept up to date by the refresher thread,\
+        so requests don't need to check the version
+        """
+        return (
+            self._refresher is not None and
+            '_version' in self._cache)
+
+    def _stats(self):
+        """
+        Return the counters of this process.\
+        These are meant to be scraped by a metrics\
+        exporter, the values are approximate
+
+        :return: A dict of counter name and value
+        """
+        return dict(self._counters)
 
-        data = dict(
-            ConfigModel.objects
-                .filter(key='_updated_at')
-                .values_list('key', 'value'))
+    def _get_backends(self):
+        """
+        Return the backends, these are\
+        created on first use. See :py:mod:`djconfig.backends`
+        """
+        if self._backends is None:
+            self._backends = backends.get_backends()
+        return self._backends
+
+    def _stop_backends(self):
+        if self._backends is not None:
+            for backend in self._backends:
+                backend.stop()
+        self._backends = None
+
+    def _get_version(self):
+        """
+        Get the config version from the first\
+        backend knowing it. The previous\
+        backends are populated with it
+
+        :return: The version, and\
+        whether the database was queried
+        """
+        missed = []
+        for backend in self._get_backends():
+            since = self._changes_since(backend)
+            if since is not None:
+                version, rows = backend.get_changes(since)
+                self._changes = since, version, rows
+            else:
+                version = backend.get_version()
+            if version is not None:
+                break
+            missed.append(backend)
+        for missed_backend in missed:
+            missed_backend.set_version(version)
+        return version, backend.hit_db
+
+    async def _aget_version(self):
+        """
+        Async version of :py:meth:`_get_version`
+        """
+        missed = []
+        for backend in self._get_backends():
+            since = self._changes_since(backend)
+            if since is not None:
+                version, rows = await backend.aget_changes(since)
+                self._changes = since, version, rows
+            else:
+                version = await backend.aget_version()
+            if version is not None:
+                break
+            missed.append(backend)
+        for missed_backend in missed:
+            await missed_backend.aset_version(version)
+        return version, backend.hit_db
 
-        if (not hasattr(self, '_updated_at') or
-                self._updated_at != data.get('_updated_at')):
-            self._reload()
+    def _changes_since(self, backend):
+        """
+        Return the version of the loaded rows, if the\
+        changes can be fetched instead of the version.\
+        That's the case if the config was not loaded\
+        from a snapshot, and the backend supports it
+        """
+        if not hasattr(backend, 'get_changes') or self._data is None:
+            return None
+        return self._data_version
+
+    def _fetched_changes(self, version):
+        """
+        Return the rows fetched along the version check,\
+        if they are the changes of the loaded rows up to\
+        the given version, or ``None`` otherwise
+        """
+        changes = self._changes
+        if (changes is None or
+                changes[0] != self._data_version or
+                changes[1] != version):
+            return None
+        return changes[2]
+
+    def _publish(self, version):
+        """
+        Let other processes/nodes know the config\
+        has changed, through every backend
+        """
+        for backend in self._get_backends():
+            backend.publish(version)
+
+    def _defer_check(self, deferred=True):
+        """
+        Defer the version check of the current request\
+        until the config is first accessed, if ever.\
+        This is called by the middleware when\
+        ``settings.DJCONFIG_LAZY_CHECK`` is set
+
+        :param bool deferred: Set it to ``False``\
+        to cancel the check once the request is done
+        """
+        _deferred_check.set(deferred)
+
+    def _check_deferred(self):
+        if _deferred_check.get():
+            # Set first, this calls __getattr__
+            _deferred_check.set(False)
+            self._reload_maybe()
+
+    def _frozen(self):
+        """
+        Return the current config as an immutable object.\
+        Reading its attributes is cheaper than reading the\
+        ones of :py:data:`config`, and the values won't change\
+        if the config is reloaded. The object is compiled once\
+        per config version, on first call. Missing keys raise\
+        ``AttributeError``, same as :py:data:`config`
+
+        :return: The compiled config
+        """
+        if self._lazy_check:
+            self._check_deferred()
+        cache, frozen = self._frozen_config
+        if cache is not self._cache:
+            cache = self._cache
+            frozen = _compile_config(cache, self._field_schemas)
+            # Swap it in one go
+            self._frozen_config = cache, frozen
+        return frozen
 
     # Unit test helpers
     def _reset(self):
-        self._registry = set()
-        self._cache = {}
+        if self._revalidator is not None:
+            self._revalidator.join()
+        self._stop_refresher()
+        self._stop_backends()
+        self.__init__()
 
     def _set(self, key, value):
-        self._cache[key] = value
+        self._set_many({key: value})
 
     def _set_many(self, items):
-        self._cache.update({
-            key: value
-            for key, value in items.items()})
+        # A new cache, so the frozen config is compiled again
+        self._cache = dict(self._cache, **items)
 
 
 config = Config()
@@ -178,3 +1332,21 @@ config = Config()
 # Public methods
 register = config._register
 reload_maybe = config._reload_maybe
+areload_maybe = config._areload_maybe
+stats = config._stats
+preload = config._preload
+prefork = config._prefork
+frozen = config._frozen
+
+
+
+def _setting_changed(setting, **kwargs):
+    # The backends are created from these settings
+    if setting.startswith('DJCONFIG_') or setting == 'CACHES':
+        config._stop_backends()
+
+
+setting_changed.connect(_setting_changed)
+
+if hasattr(os, 'register_at_fork'):  # Not on Windows
+    os.register_at_fork(after_in_child=config._after_fork)
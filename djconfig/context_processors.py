@@ -14,5 +14,9 @@ def config(request):
             # ...
             'djconfig.context_processors.config',
         )
+
+    The config attached to the request by the\
+    middleware is used, if any, so the values\
+    are the same for the whole request
     """
-    return {"config": conf.config}
+    return {"config": getattr(request, 'djconfig', conf.config)}
@@ -2,11 +2,98 @@
 
 from __future__ import unicode_literals
 
-from django.utils import timezone
+from asgiref.sync import sync_to_async
+import django
 from django.apps import apps
+from django.db import transaction, connections
+from django.db.models import F
 
 from . import conf
 from . import utils
+from . import signals
+
+
+def _upsert(model, objs):
+    """
+    Create or update the config rows in bulk
+    """
+    # Django < 4.1 does not support upserts, and
+    # some databases (ie: MySQL) don't support them
+    # on a unique field other than the primary key
+    features = connections[model.objects.db].features
+    if (django.VERSION >= (4, 1) and
+            features.supports_update_conflicts and
+            features.supports_update_conflicts_with_target):
+        model.objects.bulk_create(
+            objs,
+            update_conflicts=True,
+            unique_fields=['key'],
+            update_fields=['value', 'version'])
+        return
+
+    pks = dict(
+        model.objects
+            .filter(key__in=[obj.key for obj in objs])
+            .values_list('key', 'pk'))
+    for obj in objs:
+        obj.pk = pks.get(obj.key)
+    model.objects.bulk_update(
+        [obj for obj in objs if obj.pk is not None],
+        ['value', 'version'])
+    model.objects.bulk_create(
+        [obj for obj in objs if obj.pk is None])
+
+
+def _prep_value(model, value):
+    """
+    Convert the value the way the database would,\
+    so it can be packed
+    """
+    return model._meta.get_field('value').get_prep_value(value)
+
+
+def _save_packed(model, values, version):
+    """
+    Merge the values into the packed row. This must run\
+    after :py:func:`_increment_version`, which locks the\
+    version row, so concurrent saves don't lose values
+    """
+    value = (
+        model.objects
+            .filter(key=conf._PACKED_KEY)
+            .values_list('value', flat=True)
+            .first())
+    data = conf._unpack(value)
+    data.update({
+        key: _prep_value(model, value)
+        for key, value in values.items()})
+    _upsert(model, [
+        model(
+            key=conf._PACKED_KEY,
+            value=conf._pack(data),
+            version=version)])
+
+
+def _increment_version():
+    """
+    Increment the config version. The row stays locked\
+    until the transaction is committed, so concurrent\
+    saves get consecutive versions
+
+    :return: The new version
+    """
+    ConfigVersion = apps.get_model('djconfig.ConfigVersion')
+    updated = (
+        ConfigVersion.objects
+            .filter(pk=1)
+            .update(version=F('version') + 1))
+    if not updated:
+        ConfigVersion.objects.create(pk=1, version=1)
+        return 1
+    return (
+        ConfigVersion.objects
+            .values_list('version', flat=True)
+            .get(pk=1))
 
 
 class ConfigForm(conf._ConfigFormBase):
@@ -36,36 +123,60 @@ class ConfigForm(conf._ConfigFormBase):
     def save(self):
         """
         Save the config with the cleaned data,\
-        update the last modified date so\
+        increment the config version so\
         the config is reloaded on other process/nodes.\
         Reload the config so it can be called right away.
+
+        Every row is written in bulk within a single\
+        transaction, so other process/nodes never\
+        load a partially saved config.
         """
         assert self.__class__ in conf.config._registry,\
             '%(class_name)s is not registered' % {
                 'class_name': self.__class__.__name__
             }
 
-        ConfigModel = apps.get_model('djconfig.Config')
+        with conf._measure() as measure:
+            version = self._save()
+        conf.config._counters['saves'] += 1
+        conf.config._counters['save_seconds'] += measure['duration']
+        signals.config_saved.send(
+            sender=self.__class__,
+            form=self,
+            duration=measure['duration'],
+            queries=measure['queries'],
+            version=version,
+            keys=list(self.cleaned_data))
 
-        for field_name, value in self.cleaned_data.items():
-            value = utils.serialize(
+    def _save(self):
+        ConfigModel = apps.get_model('djconfig.Config')
+        values = {
+            field_name: utils.serialize(
                 value=value,
                 field=self.fields.get(field_name, None))
-            # TODO: use update_or_create
-            count = (ConfigModel.objects
-                .filter(key=field_name)
-                .update(value=value))
-            if not count:
-                ConfigModel.objects.create(
-                    key=field_name,
-                    value=value)
-
-        count = (ConfigModel.objects
-            .filter(key='_updated_at')
-            .update(value=str(timezone.now())))
-        if not count:
-            ConfigModel.objects.create(
-                key='_updated_at',
-                value=str(timezone.now()))
-
-        conf.config._reload()
+            for field_name, value in self.cleaned_data.items()}
+        with transaction.atomic():
+            version = _increment_version()
+            if conf._is_packed():
+                _save_packed(ConfigModel, values, version)
+            else:
+                _upsert(ConfigModel, [
+                    ConfigModel(key=key, value=value, version=version)
+                    for key, value in values.items()])
+
+        # Let other process/nodes know only
+        # once the new config is visible to them
+        transaction.on_commit(lambda: conf.config._publish(version))
+        # Other threads of this process may be reloading it
+        with conf.config._reload_lock:
+            conf.config._measure_reload(conf.config._reload, version)
+        return version
+
+    async def asave(self):
+        """
+        Async version of :py:meth:`save`.\
+        It runs :py:meth:`save` in a thread,\
+        so overriding :py:meth:`save` is enough\
+        to customize both
+        """
+        await sync_to_async(self.save)()
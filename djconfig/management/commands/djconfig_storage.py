@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ... import conf
+from ...forms import _increment_version, _upsert
+
+
+def _pack_rows(model, version):
+    """
+    Merge the rows into the packed row. Only the rows\
+    saved after the packed row are merged, so running\
+    this again picks up the saves of processes still\
+    using the rows, without undoing the packed saves
+
+    :return: The number of merged keys
+    """
+    packed = (
+        model.objects
+            .filter(key=conf._PACKED_KEY)
+            .values_list('value', 'version')
+            .first())
+    rows = model.objects.exclude(key=conf._PACKED_KEY)
+    data = {}
+    if packed is not None:
+        value, packed_version = packed
+        data = conf._unpack(value)
+        rows = rows.filter(version__gt=packed_version or 0)
+    changed = dict(rows.values_list('key', 'value'))
+    data.update(changed)
+    _upsert(model, [
+        model(
+            key=conf._PACKED_KEY,
+            value=conf._pack(data),
+            version=version)])
+    return len(changed)
+
+
+def _unpack_rows(model, version):
+    """
+    Write the packed keys into their rows. The rows\
+    saved after the packed row are kept as they are
+
+    :return: The number of written keys
+    """
+    packed = (
+        model.objects
+            .filter(key=conf._PACKED_KEY)
+            .values_list('value', 'version')
+            .first())
+    if packed is None:
+        return 0
+    value, packed_version = packed
+    row_versions = dict(
+        model.objects
+            .exclude(key=conf._PACKED_KEY)
+            .values_list('key', 'version'))
+    changed = {
+        key: value
+        for key, value in conf._unpack(value).items()
+        if key not in row_versions or
+        (row_versions[key] or 0) < (packed_version or 0)}
+    _upsert(model, [
+        model(key=key, value=value, version=version)
+        for key, value in changed.items()])
+    return len(changed)
+
+
+class Command(BaseCommand):
+    help = (
+        "Convert the stored config to the given layout, "
+        "see settings.DJCONFIG_STORAGE")
+
+    def add_arguments(self, parser):
+        parser.add_argument('storage', choices=['rows', 'packed'])
+        parser.add_argument(
+            '--delete', action='store_true',
+            help=(
+                "Delete the rows of the previous layout, "
+                "instead of converting them"))
+
+    def handle(self, *args, **options):
+        ConfigModel = apps.get_model('djconfig.Config')
+        storage = options['storage']
+
+        if options['delete']:
+            rows = ConfigModel.objects.all()
+            if storage == 'packed':
+                rows = rows.exclude(key=conf._PACKED_KEY)
+            else:
+                rows = rows.filter(key=conf._PACKED_KEY)
+            count, _ = rows.delete()
+            self.stdout.write(
+                "Deleted %(count)d rows of the previous layout" % {
+                    'count': count})
+            return
+
+        with transaction.atomic():
+            version = _increment_version()
+            if storage == 'packed':
+                count = _pack_rows(ConfigModel, version)
+            else:
+                count = _unpack_rows(ConfigModel, version)
+
+        transaction.on_commit(lambda: conf.config._publish(version))
+        self.stdout.write(
+            "Converted %(count)d keys to %(storage)s storage, "
+            "version %(version)d" % {
+                'count': count,
+                'storage': storage,
+                'version': version})
@@ -1,6 +1,10 @@
 # -*- coding: utf-8 -*-
 
 from __future__ import unicode_literals
+import re
+
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
 
 from . import conf
 
@@ -17,10 +21,79 @@ class DjConfigMiddleware(MiddlewareMixin):
     """
     Populate the cache using the database.\
     Reload the cache *only* if it is not up\
-    to date with the config model
+    to date with the config model.
+
+    The config is preloaded when the middleware\
+    is created (ie: on server start up) if\
+    ``settings.DJCONFIG_PRELOAD`` is set.
+
+    If ``settings.DJCONFIG_REFRESH_INTERVAL`` is set,\
+    a background thread keeps the config up to date\
+    and the version is not checked once the config is loaded.
+
+    The config is attached to the request as\
+    ``request.djconfig``, see :py:func:`djconfig.frozen`.\
+    Its values won't change within the request.
+
+    If ``settings.DJCONFIG_LAZY_CHECK`` is set, the version\
+    is checked on first access to the config within the\
+    request, so requests not reading it don't check it.\
+    Requests matching ``settings.DJCONFIG_EXCLUDE_PATHS``\
+    are skipped
     """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, *args, **kwargs):
+        super(DjConfigMiddleware, self).__init__(*args, **kwargs)
+
+        if getattr(settings, 'DJCONFIG_PRELOAD', False):
+            conf.preload()
+
+        conf.config._start_refresher()
+
+        self.lazy_check = getattr(settings, 'DJCONFIG_LAZY_CHECK', False)
+        conf.config._lazy_check = self.lazy_check
+
+        self.exclude_paths = [
+            re.compile(path)
+            for path in getattr(settings, 'DJCONFIG_EXCLUDE_PATHS', ())]
+
+    def _is_excluded(self, request):
+        return any(
+            path.match(request.path_info)
+            for path in self.exclude_paths)
+
     def process_request(self, request):
+        if self._is_excluded(request):
+            return
+        if conf.config._is_refreshed():
+            request.djconfig = conf.frozen()
+            return
+        if self.lazy_check:
+            conf.config._defer_check()
+            request.djconfig = SimpleLazyObject(conf.frozen)
+            return
         conf.reload_maybe()
+        request.djconfig = conf.frozen()
+
+    def process_response(self, request, response):
+        conf.config._defer_check(False)
+        return response
+
+    async def __acall__(self, request):
+        """
+        Native async version, so the version\
+        check does not run in a thread under ASGI.\
+        The check is never deferred, since the\
+        config may be accessed within the event loop
+        """
+        if self._is_excluded(request):
+            return await self.get_response(request)
+        if not conf.config._is_refreshed():
+            await conf.areload_maybe()
+        request.djconfig = conf.frozen()
+        return await self.get_response(request)
 
 
 # Backward compatibility
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+def create_version(apps, schema_editor):
+    Config = apps.get_model('djconfig', 'Config')
+    ConfigVersion = apps.get_model('djconfig', 'ConfigVersion')
+    saved = Config.objects.filter(key='_updated_at').exists()
+    ConfigVersion.objects.create(pk=1, version=int(saved))
+    Config.objects.filter(key='_updated_at').delete()
+
+
+def delete_version(apps, schema_editor):
+    ConfigVersion = apps.get_model('djconfig', 'ConfigVersion')
+    ConfigVersion.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djconfig', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConfigVersion',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', auto_created=True, primary_key=True, serialize=False)),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='config',
+            name='version',
+            field=models.BigIntegerField(blank=True, null=True, db_index=True),
+        ),
+        migrations.RunPython(create_version, delete_version),
+    ]
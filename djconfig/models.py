@@ -4,10 +4,21 @@ from __future__ import unicode_literals
 
 from django.db import models
 
-__all__ = ['Config']
+__all__ = [
+    'Config',
+    'ConfigVersion']
 
 
 class Config(models.Model):
 
     key = models.CharField(max_length=75, unique=True)
     value = models.TextField(null=True, blank=True)
+    version = models.BigIntegerField(null=True, blank=True, db_index=True)
+
+
+class ConfigVersion(models.Model):
+    """
+    Single row (``pk=1``) holding the config version,\
+    it's incremented every time the config is saved
+    """
+    version = models.BigIntegerField(default=0)
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+"""
+Signals sent by djconfig, mainly for instrumentation.
+
+Usage::
+
+    from django.dispatch import receiver
+    from djconfig.signals import config_reloaded
+
+
+    @receiver(config_reloaded)
+    def on_config_reloaded(sender, duration, queries, **kwargs):
+        metrics.timing('djconfig.reload', duration)
+"""
+
+from __future__ import unicode_literals
+
+from django.dispatch import Signal
+
+__all__ = [
+    'config_checked',
+    'config_reloaded',
+    'config_saved']
+
+#: Sent after checking the config version.\
+#: The sender is the :py:class:`djconfig.conf.Config` instance.\
+#: Arguments: ``duration`` (seconds), ``version``,\
+#: ``hit_db`` (whether the database was queried),\
+#: ``stale`` (whether the config will be reloaded)
+config_checked = Signal()
+
+#: Sent after reloading the config.\
+#: The sender is the :py:class:`djconfig.conf.Config` instance.\
+#: Arguments: ``duration`` (seconds), ``queries``, ``version``,\
+#: ``keys`` (the keys whose value changed),\
+#: ``source`` (``'snapshot'``, ``'changed'`` or ``'full'``),\
+#: ``forms`` (a dict of form class and cleaning duration)
+config_reloaded = Signal()
+
+#: Sent after saving a config form.\
+#: The sender is the form class.\
+#: Arguments: ``form``, ``duration`` (seconds),\
+#: ``queries``, ``version``, ``keys`` (the saved keys)
+config_saved = Signal()
@@ -3,7 +3,10 @@
 from __future__ import unicode_literals
 from functools import wraps
 import json
+import datetime
+import decimal
 
+from django.conf import settings
 from django.db import models
 from django import forms
 
@@ -42,8 +45,8 @@ def override_djconfig(**new_cache_values):
 
                 # This works coz the config table is empty,
                 # so even if the middleware gets called,
-                # it won't update the config (_updated_at
-                # will be None), this is assuming the table
+                # it won't update the config (the version
+                # will be zero), this is assuming the table
                 # is not populated by the user (ie: within
                 # a migration), in which case it will load
                 # all the default values
@@ -55,16 +58,82 @@ def override_djconfig(**new_cache_values):
 
     return decorator
 
+def _encode_value(value):
+    if value is None:
+        return {'t': 'none', 'v': None}
+    if isinstance(value, bool):
+        return {'t': 'bool', 'v': value}
+    if isinstance(value, int):
+        return {'t': 'int', 'v': int(value)}
+    if isinstance(value, float):
+        return {'t': 'float', 'v': float(value)}
+    if isinstance(value, str):
+        return {'t': 'str', 'v': str(value)}
+    if isinstance(value, decimal.Decimal):
+        return {'t': 'decimal', 'v': str(value)}
+    # datetime is a subclass of date
+    if isinstance(value, datetime.datetime):
+        return {'t': 'datetime', 'v': value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {'t': 'date', 'v': value.isoformat()}
+    if isinstance(value, datetime.time):
+        return {'t': 'time', 'v': value.isoformat()}
+    if isinstance(value, models.Model):
+        return {'t': 'model', 'v': value.pk}
+    if isinstance(value, models.QuerySet) or (
+            isinstance(value, (list, tuple)) and
+            value and
+            all(isinstance(v, models.Model) for v in value)):
+        return {'t': 'models', 'v': [v.pk for v in value]}
+    if isinstance(value, (list, tuple)):
+        items = [_encode_value(v) for v in value]
+        if None in items:
+            return None
+        return {'t': 'list', 'v': items}
+    return None
+
+
+def _encode(value):
+    """
+    Encode a cleaned value into a self-describing string
+
+    :return: The encoded value, or ``None``\
+    if the value type is not supported
+    """
+    typed = _encode_value(value)
+    if typed is None:
+        return None
+    try:
+        return conf._TYPED_PREFIX + json.dumps(
+            typed, separators=(',', ':'))
+    except TypeError:  # ie: UUID primary key
+        return None
+
+
 # todo: add DateField
 def serialize(value, field):
     """
     Form values serialization
 
+    If ``settings.DJCONFIG_TYPED_ENCODING`` is set,\
+    the value is stored along its type, so it's\
+    loaded without validating it again. Files\
+    and types not supported are stored as before.\
+    Strings looking like a typed value are always\
+    stored typed, so they are not mistaken for one
+
     :param object value: A value to be serialized\
     for saving it into the database and later\
     loading it into the form as initial value
     """
     assert isinstance(field, forms.Field)
+    if conf._is_typed(value):
+        return _encode(value)
+    if (getattr(settings, 'DJCONFIG_TYPED_ENCODING', False) and
+            not isinstance(field, forms.FileField)):
+        encoded = _encode(value)
+        if encoded is not None:
+            return encoded
     if isinstance(field, forms.ModelMultipleChoiceField):
         return json.dumps([v.pk for v in value])
     # todo: remove
@@ -0,0 +1,28 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import os
+import sys
+
+import django
+from django.test.runner import DiscoverRunner
+
+
+os.environ['DJANGO_SETTINGS_MODULE'] = 'tests.settings'
+
+
+def run_benchmarks():
+    test_runner = DiscoverRunner(pattern='benchmarks.py', verbosity=0)
+    failures = test_runner.run_tests(["tests", ])
+    sys.exit(failures)
+
+
+def start():
+    django.setup()
+    run_benchmarks()
+
+
+if __name__ == "__main__":
+    start()
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmarks, these are not run by ``runtests.py``.
+
+Usage::
+
+    python runbenchmarks.py
+"""
+
+from __future__ import unicode_literals
+import time
+
+from django.test import TestCase, RequestFactory, override_settings
+from django import forms
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+
+import djconfig
+from djconfig.conf import config
+from djconfig.forms import ConfigForm
+from djconfig.middleware import DjConfigMiddleware
+from djconfig.models import Config as ConfigModel, ConfigVersion
+from djconfig import utils
+from .models import ChoiceModel
+from .tests import TEST_CACHES, BarConfigAdminForm, BazConfigAdminForm
+
+
+def bench(name, func, rounds=100):
+    """
+    Run ``func`` a number of rounds and print\
+    the mean time and number of queries per round
+    """
+    func()  # warm up
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        for _ in range(rounds):
+            func()
+        elapsed = time.perf_counter() - start
+    print('%-50s %10.1fus %8.1f queries' % (
+        name,
+        elapsed / rounds * 1000000,
+        len(queries) / rounds))
+
+
+def make_form(index, fields=10):
+    """
+    Make a config form class with char, integer,\
+    boolean, model choice and file fields
+    """
+    attrs = {}
+    for i in range(fields):
+        name = 'form_%d_field_%d' % (index, i)
+        kind = i % 5
+        if kind == 0:
+            attrs[name] = forms.CharField(initial="foo")
+        elif kind == 1:
+            attrs[name] = forms.IntegerField(initial=1)
+        elif kind == 2:
+            attrs[name] = forms.BooleanField(initial=True, required=False)
+        elif kind == 3:
+            attrs[name] = forms.ModelChoiceField(
+                initial=None, queryset=ChoiceModel.objects.all())
+        else:
+            attrs[name] = forms.FileField(initial=None, required=False)
+    return type(str('Form%d' % index), (ConfigForm,), attrs)
+
+
+def make_forms(count, fields=10):
+    return [make_form(i, fields) for i in range(count)]
+
+
+def populate(form_classes):
+    """
+    Store a value for every field
+    """
+    model_choice = ChoiceModel.objects.create(name='foo')
+    values = {
+        forms.CharField: "bar",
+        forms.IntegerField: 2,
+        forms.BooleanField: False,
+        forms.ModelChoiceField: model_choice,
+        forms.FileField: 'path/file.zip'}
+    ConfigModel.objects.bulk_create([
+        ConfigModel(
+            key=name,
+            value=utils.serialize(values[type(field)], field))
+        for form_class in form_classes
+        for name, field in form_class.base_fields.items()])
+    ConfigVersion.objects.update_or_create(pk=1, defaults={'version': 111})
+
+
+class BenchMiddleware(TestCase):
+
+    def setUp(self):
+        config._reset()
+        for form_class in make_forms(10):
+            djconfig.register(form_class)
+        self.middleware = DjConfigMiddleware(lambda request: None)
+        self.request = RequestFactory().get('/')
+        djconfig.reload_maybe()
+
+    def process_request(self):
+        self.middleware(self.request)
+
+    def test_middleware(self):
+        bench('middleware', self.process_request, rounds=1000)
+
+    @override_settings(DJCONFIG_CHECK_INTERVAL=60)
+    def test_middleware_check_interval(self):
+        bench('middleware (check interval)', self.process_request, rounds=1000)
+
+    @override_settings(CACHES=TEST_CACHES, DJCONFIG_CACHE='good')
+    def test_middleware_cache(self):
+        caches['good'].clear()
+        bench('middleware (cache)', self.process_request, rounds=1000)
+
+
+class BenchAccess(TestCase):
+
+    def setUp(self):
+        config._reset()
+        for form_class in make_forms(10):
+            djconfig.register(form_class)
+        djconfig.reload_maybe()
+
+    def read(self, obj):
+        for _ in range(100):
+            obj.form_0_field_0
+            obj.form_9_field_9
+
+    def test_access_config(self):
+        bench('config access (x200)', lambda: self.read(config), rounds=1000)
+
+    def test_access_frozen(self):
+        bench(
+            'frozen config access (x200)',
+            lambda: self.read(djconfig.frozen()),
+            rounds=1000)
+
+
+class BenchReload(TestCase):
+
+    def setUp(self):
+        config._reset()
+
+    def reload(self, count, fields):
+        form_classes = make_forms(count, fields)
+        populate(form_classes)
+        for form_class in form_classes:
+            djconfig.register(form_class)
+        bench(
+            'reload (%d forms x %d fields)' % (count, fields),
+            config._reload,
+            rounds=10)
+
+    def test_reload_small(self):
+        self.reload(1, 10)
+
+    def test_reload_medium(self):
+        self.reload(10, 10)
+
+    def test_reload_large(self):
+        self.reload(50, 20)
+
+    @override_settings(DJCONFIG_LAZY_MODELS=True)
+    def test_reload_large_lazy_models(self):
+        form_classes = make_forms(50, 20)
+        populate(form_classes)
+        for form_class in form_classes:
+            djconfig.register(form_class)
+        bench(
+            'reload (50 forms x 20 fields, lazy models)',
+            config._reload,
+            rounds=10)
+
+
+class BenchSave(TestCase):
+
+    def setUp(self):
+        config._reset()
+
+    def save(self, fields):
+        form_class = make_form(0, fields)
+        djconfig.register(form_class)
+        model_choice = ChoiceModel.objects.create(name='foo')
+        form = form_class(data={
+            name: str(model_choice.pk)
+            if isinstance(field, forms.ModelChoiceField)
+            else '1'
+            for name, field in form_class.base_fields.items()})
+        self.assertTrue(form.is_valid(), form.errors)
+        bench('save (%d fields)' % fields, form.save, rounds=10)
+
+    def test_save_small(self):
+        self.save(10)
+
+    def test_save_large(self):
+        self.save(100)
+
+
+class BenchAdmin(TestCase):
+
+    def setUp(self):
+        config._reset()
+        djconfig.register(BarConfigAdminForm)
+        djconfig.register(BazConfigAdminForm)
+        user = get_user_model().objects.create_superuser(
+            'foo', 'foo@bar.com', 'bar')
+        self.client.force_login(user)
+        self.url = reverse('admin:tests_barconfig_changelist')
+
+    def changelist_view(self):
+        response = self.client.get(self.url)
+        assert response.status_code == 200
+
+    def test_admin_change_list(self):
+        bench('admin changelist_view', self.changelist_view, rounds=20)
@@ -1,25 +1,43 @@
 # -*- coding: utf-8 -*-
 
 from __future__ import unicode_literals
+import time
+import threading
+import tempfile
+import shutil
+import os
+import pickle
 import datetime
-from unittest import skipIf
+import decimal
+from io import StringIO
+from unittest import skipIf, mock
 
-from django.test import TestCase, override_settings
+from asgiref.sync import sync_to_async, async_to_sync
+
+from django.test import TestCase, RequestFactory, override_settings
 from django import forms
 from django.conf import settings
 from django import get_version
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls import reverse
 from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection, DatabaseError
+from django.test.utils import CaptureQueriesContext
 
 import djconfig
 from djconfig import forms as djconfig_forms
 from djconfig.utils import override_djconfig
 from djconfig.conf import Config, config
 from djconfig.forms import ConfigForm
-from djconfig.models import Config as ConfigModel
+from djconfig.models import Config as ConfigModel, ConfigVersion
 from djconfig.middleware import DjConfigMiddleware, DjConfigLocMemMiddleware
 from djconfig import utils
+from djconfig import conf
+from djconfig import signals
+from djconfig import backends
+from djconfig import context_processors
 from .models import ChoiceModel
 
 
@@ -31,6 +49,11 @@ def make_dummy_image():
         content_type='image/gif')
 
 
+def set_version(version):
+    ConfigVersion.objects.update_or_create(
+        pk=1, defaults={'version': version})
+
+
 class FooForm(ConfigForm):
 
     boolean = forms.BooleanField(initial=True, required=False)
@@ -175,6 +198,98 @@ class DjConfigFormsTest(TestCase):
         qs = ConfigModel.objects.get(key="char")
         self.assertEqual(qs.value, "foo2")
 
+    async def test_config_form_asave(self):
+        """
+        config form, async save
+        """
+        await sync_to_async(djconfig.register)(BarForm)
+        form = BarForm(data={"char": "foo2", })
+        self.assertTrue(form.is_valid())
+        await form.asave()
+        self.assertEqual(config.char, "foo2")
+        qs = await sync_to_async(ConfigModel.objects.get)(key="char")
+        self.assertEqual(qs.value, "foo2")
+
+    def test_config_form_save_bulk(self):
+        """
+        Should save every field in bulk
+        """
+        few_form = type(str('FewForm'), (ConfigForm,), {
+            'few_%d' % i: forms.CharField(initial="foo")
+            for i in range(2)})
+        many_form = type(str('ManyForm'), (ConfigForm,), {
+            'many_%d' % i: forms.CharField(initial="foo")
+            for i in range(50)})
+        djconfig.register(few_form)
+        djconfig.register(many_form)
+        # Both forms update and create rows
+        ConfigModel.objects.create(key="few_0", value="bar")
+        ConfigModel.objects.create(key="many_0", value="bar")
+
+        form = few_form(data={
+            'few_%d' % i: "baz"
+            for i in range(2)})
+        self.assertTrue(form.is_valid())
+        with CaptureQueriesContext(connection) as few_queries:
+            form.save()
+
+        form = many_form(data={
+            'many_%d' % i: "baz"
+            for i in range(50)})
+        self.assertTrue(form.is_valid())
+        with CaptureQueriesContext(connection) as many_queries:
+            form.save()
+
+        self.assertEqual(len(many_queries), len(few_queries))
+        self.assertEqual(
+            ConfigModel.objects.filter(
+                key__startswith='many_', value="baz").count(), 50)
+        self.assertEqual(config.many_0, "baz")
+
+    def test_config_form_save_locked(self):
+        """
+        Should reload the config within the reload lock
+        """
+        djconfig.register(BarForm)
+        reload = config._reload
+        locked = []
+
+        def locked_reload(version=None):
+            locked.append(config._reload_lock.locked())
+            return reload(version)
+
+        form = BarForm(data={"char": "foo2", })
+        self.assertTrue(form.is_valid())
+        with mock.patch.object(config, '_reload', side_effect=locked_reload):
+            form.save()
+        self.assertEqual(locked, [True])
+        self.assertFalse(config._reload_lock.locked())
+        self.assertEqual(config.char, "foo2")
+
+    def test_config_form_save_no_upsert(self):
+        """
+        Should save without upserts when\
+        the database does not support them
+        """
+        djconfig.register(BarForm)
+        ConfigModel.objects.create(key="char", value="bar")
+        # The feature does not exist in Django < 4.1
+        with mock.patch.object(
+                connection.features,
+                'supports_update_conflicts_with_target', False,
+                create=True):
+            with mock.patch.object(
+                    ConfigModel.objects, 'bulk_create',
+                    wraps=ConfigModel.objects.bulk_create) as bulk_create:
+                djconfig_forms._upsert(ConfigModel, [
+                    ConfigModel(key="char", value="foo2", version=1),
+                    ConfigModel(key="char2", value="baz", version=1)])
+        self.assertEqual(bulk_create.call_count, 1)
+        self.assertEqual(len(bulk_create.call_args[0][0]), 1)
+        self.assertEqual(
+            dict(ConfigModel.objects.values_list('key', 'value')),
+            {"char": "foo2", "char2": "baz"})
+
     def test_config_save_unregistered_form(self):
         """
         Should raise an exception if form is not registered
@@ -254,35 +369,36 @@ class DjConfigFormsTest(TestCase):
 
         self.assertEqual(config.char, "foo2")
 
-    def test_config_form_updated_at(self):
+    def test_config_form_version(self):
         """
-        updated_at should get update on every save() call
+        version should get incremented on every save() call
         """
-        now = djconfig_forms.timezone.now()
-
-        class TZMock:
-            @classmethod
-            def now(cls):
-                return now
-
-        orig_djconfig_forms_timezone, djconfig_forms.timezone = djconfig_forms.timezone, TZMock
-        try:
-            djconfig.register(BarForm)
-            form = BarForm(data={"char": "foo2", })
-            self.assertTrue(form.is_valid())
-            form.save()
-            updated_at_a = ConfigModel.objects.get(key="_updated_at").value
-
-            now += datetime.timedelta(seconds=1)
+        djconfig.register(BarForm)
+        form = BarForm(data={"char": "foo2", })
+        self.assertTrue(form.is_valid())
+        form.save()
+        self.assertEqual(ConfigVersion.objects.get(pk=1).version, 1)
+        self.assertEqual(ConfigModel.objects.get(key="char").version, 1)
+        self.assertEqual(config._version, 1)
 
-            form = BarForm(data={"char": "foo2", })
-            self.assertTrue(form.is_valid())
-            form.save()
-            updated_at_b = ConfigModel.objects.get(key="_updated_at").value
+        form = BarForm(data={"char": "foo2", })
+        self.assertTrue(form.is_valid())
+        form.save()
+        self.assertEqual(ConfigVersion.objects.get(pk=1).version, 2)
+        self.assertEqual(ConfigModel.objects.get(key="char").version, 2)
+        self.assertEqual(config._version, 2)
 
-            self.assertNotEqual(updated_at_a, updated_at_b)
-        finally:
-            djconfig_forms.timezone = orig_djconfig_forms_timezone
+    def test_config_form_version_missing(self):
+        """
+        Should create the version row if it's missing
+        """
+        ConfigVersion.objects.all().delete()
+        djconfig.register(BarForm)
+        form = BarForm(data={"char": "foo2", })
+        self.assertTrue(form.is_valid())
+        form.save()
+        self.assertEqual(ConfigVersion.objects.get(pk=1).version, 1)
+        self.assertEqual(config._version, 1)
 
     def test_image_form_conf(self):
         """
@@ -464,20 +580,81 @@ class DjConfigConfTest(TestCase):
         djconfig.reload_maybe()
         self.assertEqual(config.integer, 123)
 
-    def test_config_load_updated_at(self):
+    def test_config_load_version(self):
         """
-        Load updated_at
+        Load version
         """
         djconfig.register(FooForm)
         djconfig.reload_maybe()
-        self.assertIsNone(config._updated_at)
+        self.assertEqual(config._version, 0)
 
-        ConfigModel.objects.create(key="_updated_at", value="string")
+        set_version(5)
         config._reset()
 
         djconfig.register(FooForm)
         djconfig.reload_maybe()
-        self.assertEqual(config._updated_at, "string")
+        self.assertEqual(config._version, 5)
+
+    async def test_config_areload_maybe(self):
+        """
+        Should reload the config in async mode
+        """
+        await sync_to_async(djconfig.register)(BarForm)
+        await djconfig.areload_maybe()
+        self.assertEqual(config.char, "foo")
+
+        await sync_to_async(ConfigModel.objects.create)(key="char", value="bar")
+        await djconfig.areload_maybe()
+        self.assertEqual(config.char, "foo")
+
+        await sync_to_async(set_version)(111)
+        await djconfig.areload_maybe()
+        self.assertEqual(config.char, "bar")
+
+    def test_config_preload(self):
+        """
+        Should load the config
+        """
+        djconfig.register(BarForm)
+        self.assertTrue(djconfig.preload())
+        self.assertEqual(config.char, "foo")
+
+    def test_config_preload_no_db(self):
+        """
+        Should skip the preload if the database is not ready
+        """
+        djconfig.register(BarForm)
+        with mock.patch.object(
+                config, '_get_version', side_effect=DatabaseError):
+            with self.assertLogs('djconfig.conf', 'WARNING'):
+                self.assertFalse(djconfig.preload())
+        self.assertRaises(AttributeError, lambda: config.char)
+
+    def test_config_prefork(self):
+        """
+        Should load the config and close the connections
+        """
+        djconfig.register(BarForm)
+        with mock.patch.object(conf.connections, 'close_all') as close_all, \
+                mock.patch.object(conf.gc, 'freeze') as freeze:
+            self.assertTrue(djconfig.prefork())
+        self.assertTrue(close_all.called)
+        self.assertTrue(freeze.called)
+        self.assertEqual(config.char, "foo")
+
+    def test_config_after_fork(self):
+        """
+        Should reset the lock and counters, and keep the config
+        """
+        djconfig.register(BarForm)
+        djconfig.reload_maybe()
+        config._reload_lock.acquire()
+        config._after_fork()
+        self.assertFalse(config._reload_lock.locked())
+        self.assertEqual(djconfig.stats(), {})
+        self.assertEqual(config.char, "foo")
+        with self.assertNumQueries(1):
+            djconfig.reload_maybe()
 
     def test_config_reload_maybe(self):
         """
@@ -489,53 +666,1700 @@ class DjConfigConfTest(TestCase):
         djconfig.reload_maybe()
         self.assertEqual(config.char, "foo")
 
+    @override_settings(DJCONFIG_CHECK_INTERVAL=60)
+    def test_config_reload_maybe_interval(self):
+        """
+        Should not check the version within the interval
+        """
+        djconfig.register(BarForm)
+        djconfig.reload_maybe()
+        self.assertEqual(config.char, "foo")
 
-TEST_CACHES = {
-    'good': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    },
-    'bad': {
-        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
-    }
-}
+        ConfigModel.objects.create(key="char", value="bar")
+        set_version(111)
+        with self.assertNumQueries(0):
+            djconfig.reload_maybe()
+        self.assertEqual(config.char, "foo")
 
+        config._checked_at -= 60
+        djconfig.reload_maybe()
+        self.assertEqual(config.char, "bar")
+
+    @override_settings(DJCONFIG_CHECK_INTERVAL=60)
+    def test_config_reload_maybe_force(self):
+        """
+        Should check the version within the interval if forced
+        """
+        djconfig.register(BarForm)
+        djconfig.reload_maybe()
+        ConfigModel.objects.create(key="char", value="bar")
+        set_version(111)
+        djconfig.reload_maybe(force=True)
+        self.assertEqual(config.char, "bar")
 
-class DjConfigMiddlewareTest(TestCase):
+
+class DjConfigReloadLockTest(TestCase):
 
     def setUp(self):
         config._reset()
 
-    def test_config_middleware_process_request(self):
+    @override_settings(DJCONFIG_RELOAD_WAIT=False)
+    def test_config_reload_no_wait(self):
         """
-        config middleware, reload cache
+        Should keep using the current config\
+        while another thread is reloading it
         """
-        ConfigModel.objects.create(key="char", value="foo")
         djconfig.register(BarForm)
         djconfig.reload_maybe()
-        config._set('char', None)
+        ConfigModel.objects.create(key="char", value="bar")
+        set_version(111)
 
-        # Should not reload since _updated_at does not exists (form was not saved)
-        middleware = DjConfigMiddleware(get_response=lambda req: None)
-        middleware.process_request(request=None)
-        self.assertIsNone(config._cache.get('char'))
+        with config._reload_lock:
+            djconfig.reload_maybe()
+            self.assertEqual(config.char, "foo")
 
-        # Changing _updated_at should make it reload
-        ConfigModel.objects.create(key="_updated_at", value="111")
-        middleware.process_request(request=None)
-        self.assertEqual(config._cache.get('char'), "foo")
-        self.assertEqual(config._cache.get("_updated_at"), "111")
+        djconfig.reload_maybe()
+        self.assertEqual(config.char, "bar")
 
-        # It does not update again, since _updated_at has not changed
-        ConfigModel.objects.filter(key="char").update(value="bar")
-        middleware.process_request(request=None)
-        self.assertNotEqual(config._cache.get('char'), "bar")
-        self.assertEqual(config._cache.get("_updated_at"), "111")
+    def test_config_reload_single_flight(self):
+        """
+        Should reload once when many threads see the change
+        """
+        djconfig.register(BarForm)
+        djconfig.reload_maybe()
+        calls = []
 
-        # Changing _updated_at should make it reload
-        ConfigModel.objects.filter(key="_updated_at").update(value="222")
-        middleware.process_request(request=None)
-        self.assertEqual(config._cache.get('char'), "bar")
-        self.assertEqual(config._cache.get("_updated_at"), "222")
+        def reload(version=None):
+            calls.append(True)
+            config._cache = dict(config._cache, _version=111)
+
+        config._reload = reload
+        try:
+            with config._reload_lock:
+                threads = [
+                    threading.Thread(
+                        target=config._reload_stale, args=(111,))
+                    for _ in range(5)]
+                for thread in threads:
+                    thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            del config._reload
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(config._version, 111)
+
+    @override_settings(DJCONFIG_STALE_WHILE_REVALIDATE=True)
+    def test_config_stale_while_revalidate(self):
+        """
+        Should keep using the current config\
+        while it's reloaded in the background
+        """
+        djconfig.register(BarForm)
+        djconfig.reload_maybe()
+        set_version(111)
+        released = threading.Event()
+
+        def refresh(version):
+            released.wait(5)
+            config._cache = dict(
+                config._cache, char="bar", _version=version)
+
+        with mock.patch.object(config, '_refresh', side_effect=refresh) as m:
+            djconfig.reload_maybe()
+            self.assertEqual(config.char, "foo")
+            djconfig.reload_maybe()
+            self.assertEqual(config.char, "foo")
+            released.set()
+            config._revalidator.join()
+        self.assertEqual(m.call_count, 1)
+        self.assertEqual(config.char, "bar")
+        self.assertIsNone(config._stale_since)
+
+    @override_settings(DJCONFIG_STALE_WHILE_REVALIDATE=True)
+    def test_config_stale_while_revalidate_first_load(self):
+        """
+        Should wait for the config if there is none
+        """
+        djconfig.register(BarForm)
+        with mock.patch.object(config, '_revalidate') as revalidate:
+            djconfig.reload_maybe()
+        self.assertFalse(revalidate.called)
+        self.assertEqual(config.char, "foo")
+
+    @override_settings(
+        DJCONFIG_STALE_WHILE_REVALIDATE=True,
+        DJCONFIG_MAX_STALENESS=60)
+    def test_config_max_staleness(self):
+        """
+        Should wait for the config once it's been\
+        stale for more than DJCONFIG_MAX_STALENESS
+        """
+        djconfig.register(BarForm)
+        djconfig.reload_maybe()
+        ConfigModel.objects.create(key="char", value="bar")
+        set_version(111)
+
+        with mock.patch.object(config, '_revalidate') as revalidate:
+            djconfig.reload_maybe()
+            self.assertEqual(revalidate.call_count, 1)
+            self.assertEqual(config.char, "foo")
+            config._stale_since -= 60
+            djconfig.reload_maybe()
+            self.assertEqual(revalidate.call_count, 1)
+        self.assertEqual(config.char, "bar")
+        self.assertIsNone(config._stale_since)
+
+
+class DjConfigSchemaTest(TestCase):
+
+    def setUp(self):
+        config._reset()
+
+    def test_config_schema_register(self):
+        """
+        Should compile the form schema on register
+        """
+        djconfig.register(FooForm)
+        schema = config._schemas[FooForm]
+        self.assertFalse(schema.use_form)
+        self.assertEqual(
+            [field.name for field in schema.fields],
+            list(FooForm.base_fields))
+        self.assertEqual(
+            [field.name for field in schema.fields if field.is_file],
+            ['image', 'file'])
+        self.assertEqual(schema.fields[0].initial, True)
+
+    def test_config_schema_hooks(self):
+        """
+        Should build the form if it has hooks
+        """
+        class InitForm(ConfigForm):
+            char = forms.CharField(initial="foo")
+
+            def __init__(self, *args, **kwargs):
+                super(InitForm, self).__init__(*args, **kwargs)
+
+        class PostCleanForm(ConfigForm):
+            char2 = forms.CharField(initial="foo")
+
+            def _post_clean(self):
+                pass
+
+        djconfig.register(ModelChoicePKForm)
+        djconfig.register(InitForm)
+        djconfig.register(PostCleanForm)
+        self.assertTrue(config._schemas[ModelChoicePKForm].use_form)
+        self.assertTrue(config._schemas[InitForm].use_form)
+        self.assertTrue(config._schemas[PostCleanForm].use_form)
+
+    def test_config_schema_reload(self):
+        """
+        Should not build the form
+        """
+        ConfigModel.objects.create(key="char", value="bar")
+        djconfig.register(BarForm)
+        with mock.patch.object(BarForm, '__init__', side_effect=AssertionError):
+            djconfig.reload_maybe()
+        self.assertEqual(config.char, "bar")
+
+    def test_config_schema_reload_hooks(self):
+        """
+        Should clean the value using the form hooks
+        """
+        model_choice = ChoiceModel.objects.create(name='foo')
+        ConfigModel.objects.create(key="model_choice", value=model_choice.pk)
+        djconfig.register(ModelChoicePKForm)
+        djconfig.reload_maybe()
+        self.assertEqual(config.model_choice, model_choice.pk)
+
+
+class DjConfigFrozenTest(TestCase):
+
+    def setUp(self):
+        config._reset()
+
+    def test_config_frozen(self):
+        """
+        Should compile the config into an immutable object
+        """
+        ConfigModel.objects.create(key="char", value="bar")
+        djconfig.register(BarForm)
+        djconfig.reload_maybe()
+        frozen = djconfig.frozen()
+        self.assertEqual(frozen.char, "bar")
+        self.assertEqual(frozen._version, 0)
+        self.assertFalse(hasattr(frozen, '__dict__'))
+        self.assertRaises(AttributeError, setattr, frozen, 'char', "baz")
+        self.assertRaises(AttributeError, delattr, frozen, 'char')
+        self.assertEqual(frozen.char, "bar")
+
+    def test_config_frozen_missing(self):
+        """
+        Should raise the same error as the config
+        """
+        djconfig.register(BarForm)
+        djconfig.reload_maybe()
+        with self.assertRaises(AttributeError) as frozen_err:
+            djconfig.frozen().foo
+        with self.assertRaises(AttributeError) as config_err:
+            config.foo
+        self.assertEqual(
+            str(frozen_err.exception), str(config_err.exception))
+
+    def test_config_frozen_reload(self):
+        """
+        Should compile it once per version
+        """
+        djconfig.register(BarForm)
+        djconfig.reload_maybe()
+        frozen = djconfig.frozen()
+        self.assertIs(djconfig.frozen(), frozen)
+
+        ConfigModel.objects.create(key="char", value="bar")
+        set_version(111)
+        djconfig.reload_maybe()
+        self.assertEqual(frozen.char, "foo")
+        self.assertEqual(djconfig.frozen().char, "bar")
+        # The class is generated once per key set
+        self.assertIs(type(djconfig.frozen()), type(frozen))
+
+    def test_config_frozen_set(self):
+        """
+        Should compile it again on set
+        """
+        djconfig.register(BarForm)
+        djconfig.reload_maybe()
+        frozen = djconfig.frozen()
+        config._set("char", "bar")
+        self.assertEqual(frozen.char, "foo")
+        self.assertEqual(djconfig.frozen().char, "bar")
+
+        @utils.override_djconfig(char="baz")
+        def overridden():
+            return djconfig.frozen().char
+
+        self.assertEqual(overridden(), "baz")
+        self.assertEqual(djconfig.frozen().char, "bar")
+
+    @override_settings(DJCONFIG_LAZY_MODELS=True)
+    def test_config_frozen_lazy(self):
+        """
+        Should query the model instance on first access
+        """
+        model_choice = ChoiceModel.objects.create(name='foo')
+        ConfigModel.objects.create(key="model_choice", value=model_choice.pk)
+        djconfig.register(ModelChoiceForm)
+        djconfig.reload_maybe()
+        with self.assertNumQueries(0):
+            frozen = djconfig.frozen()
+        with self.assertNumQueries(1):
+            self.assertEqual(frozen.model_choice, model_choice)
+        with self.assertNumQueries(0):
+            self.assertEqual(frozen.model_choice, model_choice)
+            self.assertEqual(config.model_choice, model_choice)
+
+        model_choice_b = ChoiceModel.objects.create(name='bar')
+        ConfigModel.objects.filter(key="model_choice").update(
+            value=model_choice_b.pk)
+        set_version(111)
+        djconfig.reload_maybe()
+        self.assertIs(type(djconfig.frozen()), type(frozen))
+        self.assertEqual(djconfig.frozen().model_choice, model_choice_b)
+        self.assertEqual(frozen.model_choice, model_choice)
+        with self.assertRaises(AttributeError):
+            frozen.model_choice = model_choice_b
+
+
+@override_settings(DJCONFIG_LAZY_MODELS=True)
+class DjConfigLazyModelsTest(TestCase):
+
+    def setUp(self):
+        config._reset()
+
+    def test_config_lazy_model_choice(self):
+        """
+        Should query the model instance on first access
+        """
+        model_choice = ChoiceModel.objects.create(name='foo')
+        ConfigModel.objects.create(key="model_choice", value=model_choice.pk)
+        djconfig.register(ModelChoiceForm)
+        # version, rows
+        with self.assertNumQueries(2):
+            djconfig.reload_maybe()
+        with self.assertNumQueries(1):
+            self.assertEqual(config.model_choice, model_choice)
+        with self.assertNumQueries(0):
+            self.assertEqual(config.model_choice, model_choice)
+
+    def test_config_lazy_model_multi_choice(self):
+        """
+        Should query the model instances on first access
+        """
+        model_choice_a = ChoiceModel.objects.create(name='foo')
+        model_choice_b = ChoiceModel.objects.create(name='bar')
+        ConfigModel.objects.create(
+            key="model_choices",
+            value=utils.serialize(
+                ChoiceModel.objects.all(),
+                forms.ModelMultipleChoiceField(None)))
+        djconfig.register(ModelMultipleChoiceForm)
+        djconfig.reload_maybe()
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                config.model_choices, [model_choice_a, model_choice_b])
+
+    def test_config_lazy_model_choice_invalid(self):
+        """
+        Should return the initial value if the instance does not exist
+        """
+        ConfigModel.objects.create(key="model_choice", value="1")
+        djconfig.register(ModelChoiceForm)
+        djconfig.reload_maybe()
+        self.assertIsNone(config.model_choice)
+
+    def test_config_lazy_model_choice_reload(self):
+        """
+        Should query the model instance again on reload
+        """
+        model_choice = ChoiceModel.objects.create(name='foo')
+        djconfig.register(ModelChoiceForm)
+        form = ModelChoiceForm(data={"model_choice": str(model_choice.pk), })
+        self.assertTrue(form.is_valid())
+        form.save()
+        self.assertEqual(config.model_choice, model_choice)
+
+        model_choice.name = 'bar'
+        model_choice.save()
+        self.assertEqual(config.model_choice.name, 'foo')
+        form.save()
+        self.assertEqual(config.model_choice.name, 'bar')
+
+    def test_config_lazy_model_choice_pickle(self):
+        """
+        Should pickle the lazy values, including empty ones
+        """
+        model_choice = ChoiceModel.objects.create(name='foo')
+        ConfigModel.objects.create(key="model_choice", value=None)
+        ConfigModel.objects.create(key="model_choices", value="[]")
+        djconfig.register(ModelChoiceForm)
+        djconfig.register(ModelMultipleChoiceForm)
+        djconfig.reload_maybe()
+        cache = pickle.loads(pickle.dumps(config._cache))
+        self.assertIsInstance(cache['model_choice'], conf._LazyValue)
+        self.assertIsNone(cache['model_choice'].value)
+        self.assertEqual(cache['model_choices'].value, "[]")
+
+        lazy_value = pickle.loads(pickle.dumps(
+            conf._LazyValue(str(model_choice.pk))))
+        self.assertEqual(
+            lazy_value.resolve(config._field_schemas['model_choice']),
+            model_choice)
+
+    def test_config_lazy_model_choice_hooks(self):
+        """
+        Should clean forms with hooks on reload
+        """
+        model_choice = ChoiceModel.objects.create(name='foo')
+        ConfigModel.objects.create(key="model_choice", value=model_choice.pk)
+        djconfig.register(ModelChoicePKForm)
+        djconfig.reload_maybe()
+        self.assertEqual(config._cache['model_choice'], model_choice.pk)
+
+
+class DjConfigReloadChangedTest(TestCase):
+
+    def setUp(self):
+        config._reset()
+
+    def test_config_reload_changed(self):
+        """
+        Should load the changed rows and re-validate their forms only
+        """
+        model_choice = ChoiceModel.objects.create(name='foo')
+        djconfig.register(BarForm)
+        djconfig.register(ModelChoiceForm)
+        form = ModelChoiceForm(data={"model_choice": str(model_choice.pk), })
+        self.assertTrue(form.is_valid())
+        form.save()
+        self.assertEqual(config.model_choice, model_choice)
+
+        # Saved by another process
+        ConfigModel.objects.create(key="char", value="bar", version=111)
+        set_version(111)
+
+        # version and changed rows
+        with self.assertNumQueries(1):
+            djconfig.reload_maybe()
+        self.assertEqual(config.char, "bar")
+        self.assertEqual(config.model_choice, model_choice)
+        self.assertEqual(config._version, 111)
+        self.assertEqual(config._data_version, 111)
+
+        with self.assertNumQueries(1):
+            djconfig.reload_maybe()
+        self.assertEqual(djconfig.stats()['reloads_changed'], 1)
+
+    async def test_config_reload_changed_async(self):
+        """
+        Should load the changed rows along the version
+        """
+        await sync_to_async(djconfig.register)(BarForm)
+        form = BarForm(data={"char": "foo2", })
+        self.assertTrue(form.is_valid())
+        await form.asave()
+
+        await sync_to_async(ConfigModel.objects.filter(key="char").update)(
+            value="bar", version=111)
+        await sync_to_async(set_version)(111)
+        await djconfig.areload_maybe()
+        self.assertEqual(config.char, "bar")
+        self.assertEqual(config._version, 111)
+
+    def test_config_reload_changed_query(self):
+        """
+        Should return the version and the changed rows
+        """
+        self.assertEqual(backends.get_db_changes(0), (0, []))
+        set_version(2)
+        ConfigModel.objects.create(key="char", value="foo", version=1)
+        ConfigModel.objects.create(key="char2", value="bar", version=2)
+        ConfigModel.objects.create(key="char3", value="baz")
+        self.assertEqual(
+            backends.get_db_changes(1), (2, [("char2", "bar", 2)]))
+        self.assertEqual(
+            async_to_sync(backends.PollBackend().aget_changes)(1),
+            (2, [("char2", "bar", 2)]))
+
+    def test_config_reload_changed_by_hand(self):
+        """
+        Should reload everything when the rows\
+        were modified without saving a form
+        """
+        djconfig.register(BarForm)
+        form = BarForm(data={"char": "foo2", })
+        self.assertTrue(form.is_valid())
+        form.save()
+
+        ConfigModel.objects.filter(key="char").update(value="bar")
+        set_version(111)
+        djconfig.reload_maybe()
+        self.assertEqual(config.char, "bar")
+        self.assertEqual(config._version, 111)
+
+    def test_config_reload_changed_not_loaded(self):
+        """
+        Should reload everything when the config was never loaded
+        """
+        djconfig.register(BarForm)
+        self.assertFalse(config._reload_changed(1))
+
+
+class PackedForm(ConfigForm):
+
+    integer = forms.IntegerField(initial=123)
+    boolean = forms.BooleanField(initial=True, required=False)
+
+
+@override_settings(DJCONFIG_STORAGE='packed')
+class DjConfigPackedTest(TestCase):
+
+    def setUp(self):
+        config._reset()
+
+    def test_config_packed_save(self):
+        """
+        Should save the whole config into a single row
+        """
+        djconfig.register(BarForm)
+        djconfig.register(PackedForm)
+        form = BarForm(data={"char": "foo2", })
+        self.assertTrue(form.is_valid())
+        form.save()
+        form = PackedForm(data={"integer": 321, })
+        self.assertTrue(form.is_valid())
+        form.save()
+        self.assertEqual(ConfigModel.objects.count(), 1)
+        row = ConfigModel.objects.get()
+        self.assertEqual(row.key, conf._PACKED_KEY)
+        self.assertEqual(row.version, 2)
+        data = conf._unpack(row.value)
+        self.assertEqual(data['char'], "foo2")
+        self.assertEqual(data['integer'], "321")
+        self.assertEqual(data['boolean'], "False")
+
+        config._reset()
+        djconfig.register(BarForm)
+        djconfig.register(PackedForm)
+        djconfig.reload_maybe()
+        self.assertEqual(config.char, "foo2")
+        self.assertEqual(config.integer, 321)
+        self.assertFalse(config.boolean)
+        self.assertEqual(config._version, 2)
+
+    def test_config_packed_reload(self):
+        """
+        Should load the config in a single row fetch
+        """
+        djconfig.register(BarForm)
+        ConfigModel.objects.create(key="char", value="ignored", version=1)
+        ConfigModel.objects.create(
+            key=conf._PACKED_KEY, value=conf._pack({"char": "bar"}), version=1)
+        set_version(1)
+
+        # version, and packed row
+        with self.assertNumQueries(2):
+            djconfig.reload_maybe()
+        self.assertEqual(config.char, "bar")
+        self.assertEqual(config._data_version, 1)
+
+    def test_config_packed_reload_changed(self):
+        """
+        Should reload the forms of the modified keys only
+        """
+        model_choice = ChoiceModel.objects.create(name='foo')
+        djconfig.register(BarForm)
+        djconfig.register(ModelChoiceForm)
+        form = ModelChoiceForm(data={"model_choice": str(model_choice.pk), })
+        self.assertTrue(form.is_valid())
+        form.save()
+
+        # Saved by another process
+        data = conf._unpack(ConfigModel.objects.get().value)
+        data['char'] = "bar"
+        ConfigModel.objects.update(value=conf._pack(data), version=111)
+        set_version(111)
+
+        # version and changed rows
+        with self.assertNumQueries(1):
+            djconfig.reload_maybe()
+        self.assertEqual(config.char, "bar")
+        self.assertEqual(config.model_choice, model_choice)
+        self.assertEqual(config._version, 111)
+        self.assertEqual(config._data_version, 111)
+        self.assertEqual(djconfig.stats()['reloads_changed'], 1)
+
+    def test_config_packed_command(self):
+        """
+        Should convert the rows into the packed row, and back
+        """
+        djconfig.register(BarForm)
+        with override_settings(DJCONFIG_STORAGE='rows'):
+            form = BarForm(data={"char": "bar", })
+            self.assertTrue(form.is_valid())
+            form.save()
+        call_command('djconfig_storage', 'packed', stdout=StringIO())
+        self.assertEqual(ConfigModel.objects.count(), 2)
+        self.assertEqual(
+            conf._unpack(ConfigModel.objects.get(key=conf._PACKED_KEY).value),
+            {"char": "bar"})
+        self.assertEqual(ConfigVersion.objects.get().version, 2)
+
+        config._reset()
+        djconfig.register(BarForm)
+        djconfig.reload_maybe()
+        self.assertEqual(config.char, "bar")
+
+        form = BarForm(data={"char": "baz", })
+        self.assertTrue(form.is_valid())
+        form.save()
+        call_command('djconfig_storage', 'rows', stdout=StringIO())
+        call_command(
+            'djconfig_storage', 'rows', '--delete', stdout=StringIO())
+        self.assertEqual(
+            list(ConfigModel.objects.values_list('key', 'value', 'version')),
+            [("char", "baz", 4)])
+
+        with override_settings(DJCONFIG_STORAGE='rows'):
+            config._reset()
+            djconfig.register(BarForm)
+            djconfig.reload_maybe()
+            self.assertEqual(config.char, "baz")
+
+
+    def test_config_packed_command_rollout(self):
+        """
+        Should not undo the packed saves when\
+        converting again or deleting the rows
+        """
+        djconfig.register(BarForm)
+        with override_settings(DJCONFIG_STORAGE='rows'):
+            form = BarForm(data={"char": "rows-value", })
+            self.assertTrue(form.is_valid())
+            form.save()
+        call_command('djconfig_storage', 'packed', stdout=StringIO())
+        form = BarForm(data={"char": "packed-value", })
+        self.assertTrue(form.is_valid())
+        form.save()
+
+        # Processes not deployed yet
+        ConfigModel.objects.create(key="char2", value="bar", version=1)
+        ConfigModel.objects.create(key="char3", value="baz", version=4)
+        set_version(4)
+
+        call_command('djconfig_storage', 'packed', stdout=StringIO())
+        self.assertEqual(
+            conf._unpack(ConfigModel.objects.get(key=conf._PACKED_KEY).value),
+            {"char": "packed-value", "char3": "baz"})
+        call_command(
+            'djconfig_storage', 'packed', '--delete', stdout=StringIO())
+        self.assertEqual(
+            list(ConfigModel.objects.values_list('key', flat=True)),
+            [conf._PACKED_KEY])
+
+        config._reset()
+        djconfig.register(BarForm)
+        djconfig.reload_maybe()
+        self.assertEqual(config.char, "packed-value")
+
+
+class TypedForm(ConfigForm):
+
+    boolean = forms.BooleanField(initial=True, required=False)
+    integer = forms.IntegerField(initial=123)
+    decimal = forms.DecimalField(initial=None, required=False)
+    date = forms.DateField(initial=None, required=False)
+    datetime = forms.DateTimeField(initial=None, required=False)
+    choices = forms.MultipleChoiceField(
+        initial=None, required=False,
+        choices=[('1', 'label_a'), ('2', 'label_b')])
+    model_choice = forms.ModelChoiceField(
+        initial=None, required=False, queryset=ChoiceModel.objects.all())
+    model_choices = forms.ModelMultipleChoiceField(
+        initial=None, required=False, queryset=ChoiceModel.objects.all())
+
+
+@override_settings(DJCONFIG_TYPED_ENCODING=True)
+class DjConfigTypedEncodingTest(TestCase):
+
+    def setUp(self):
+        config._reset()
+
+    def save_typed_form(self):
+        self.model_choice = ChoiceModel.objects.create(name='foo')
+        self.model_choice_b = ChoiceModel.objects.create(name='bar')
+        djconfig.register(TypedForm)
+        form = TypedForm(data={
+            "integer": "321",
+            "decimal": "1.50",
+            "date": "2020-01-02",
+            "datetime": "2020-01-02 03:04:05",
+            "choices": ["1", "2"],
+            "model_choice": str(self.model_choice.pk),
+            "model_choices": [
+                str(self.model_choice.pk),
+                str(self.model_choice_b.pk)]})
+        self.assertTrue(form.is_valid())
+        form.save()
+
+    def assert_typed_config(self):
+        self.assertIs(config.boolean, False)
+        self.assertEqual(config.integer, 321)
+        self.assertEqual(config.decimal, decimal.Decimal('1.50'))
+        self.assertEqual(config.date, datetime.date(2020, 1, 2))
+        self.assertEqual(
+            config.datetime, datetime.datetime(2020, 1, 2, 3, 4, 5))
+        self.assertEqual(config.choices, ["1", "2"])
+        self.assertEqual(config.model_choice, self.model_choice)
+        self.assertEqual(
+            set(config.model_choices),
+            {self.model_choice, self.model_choice_b})
+
+    def test_config_typed_save(self):
+        """
+        Should store the values along their type
+        """
+        self.save_typed_form()
+        values = dict(ConfigModel.objects.values_list('key', 'value'))
+        self.assertEqual(
+            values['integer'], 'djconfig+json:{"t":"int","v":321}')
+        self.assertEqual(
+            values['model_choice'],
+            'djconfig+json:{"t":"model","v":%d}' % self.model_choice.pk)
+        self.assert_typed_config()
+
+    def test_config_typed_reload(self):
+        """
+        Should load the values without validating them
+        """
+        self.save_typed_form()
+        config._reset()
+        djconfig.register(TypedForm)
+        with mock.patch.object(forms.IntegerField, 'clean') as clean:
+            # version, rows, model, and models
+            with self.assertNumQueries(4):
+                djconfig.reload_maybe()
+        self.assertFalse(clean.called)
+        self.assert_typed_config()
+
+    def test_config_typed_decode(self):
+        """
+        Should decode the typed values regardless of the setting
+        """
+        self.save_typed_form()
+        with override_settings(DJCONFIG_TYPED_ENCODING=False):
+            config._reset()
+            djconfig.register(TypedForm)
+            djconfig.reload_maybe()
+            self.assert_typed_config()
+
+            form = TypedForm(data={"integer": "1"})
+            self.assertTrue(form.is_valid())
+            form.save()
+            self.assertEqual(
+                ConfigModel.objects.get(key="integer").value, "1")
+            self.assertEqual(config.integer, 1)
+
+    def test_config_typed_invalid(self):
+        """
+        Should load the initial value when\
+        the value can't be decoded
+        """
+        self.save_typed_form()
+        self.model_choice.delete()
+        ConfigModel.objects.filter(key="integer").update(
+            value='djconfig+json:{"t":"foo","v":1}')
+        config._reload()
+        self.assertEqual(config.integer, 123)
+        self.assertIsNone(config.model_choice)
+
+    def test_config_typed_hooks(self):
+        """
+        Should load the values cleaned\
+        by the form hooks when saved
+        """
+        djconfig.register(ModelChoicePKForm)
+        model_choice = ChoiceModel.objects.create(name='foo')
+        form = ModelChoicePKForm(data={"model_choice": str(model_choice.pk), })
+        self.assertTrue(form.is_valid())
+        form.save()
+        self.assertEqual(
+            ConfigModel.objects.get(key="model_choice").value,
+            'djconfig+json:{"t":"int","v":%d}' % model_choice.pk)
+
+        with mock.patch.object(
+                ModelChoicePKForm, 'clean_model_choice') as clean:
+            config._reload()
+        self.assertFalse(clean.called)
+        self.assertEqual(config.model_choice, model_choice.pk)
+
+    def test_config_typed_prefix(self):
+        """
+        Should not mistake a string starting\
+        with the prefix for a typed value
+        """
+        djconfig.register(BarForm)
+        value = 'djconfig+json:{"t":"int","v":1}'
+        for typed_encoding in (True, False):
+            with override_settings(DJCONFIG_TYPED_ENCODING=typed_encoding):
+                form = BarForm(data={"char": value, })
+                self.assertTrue(form.is_valid())
+                form.save()
+                self.assertEqual(config.char, value)
+                config._reload()
+                self.assertEqual(config.char, value)
+                self.assertEqual(BarForm().initial['char'], value)
+
+    @override_settings(DJCONFIG_LAZY_MODELS=True)
+    def test_config_typed_lazy_models(self):
+        """
+        Should query the typed model values on first access
+        """
+        self.save_typed_form()
+        config._reload()
+        with self.assertNumQueries(1):
+            self.assertEqual(config.model_choice, self.model_choice)
+
+
+class DjConfigSignalsTest(TestCase):
+
+    def setUp(self):
+        config._reset()
+        self.calls = []
+
+    def receiver(self, signal, **kwargs):
+        self.calls.append(kwargs)
+
+    def connect(self, signal):
+        signal.connect(self.receiver)
+        self.addCleanup(signal.disconnect, self.receiver)
+
+    def test_config_checked(self):
+        """
+        Should send the checked signal
+        """
+        self.connect(signals.config_checked)
+        djconfig.register(BarForm)
+        djconfig.reload_maybe()
+        djconfig.reload_maybe()
+        self.assertEqual(len(self.calls), 2)
+        self.assertIs(self.calls[0]['sender'], config)
+        self.assertEqual(self.calls[0]['version'], 0)
+        self.assertTrue(self.calls[0]['hit_db'])
+        self.assertTrue(self.calls[0]['stale'])
+        self.assertFalse(self.calls[1]['stale'])
+        self.assertGreaterEqual(self.calls[0]['duration'], 0)
+
+    def test_config_reloaded(self):
+        """
+        Should send the reloaded signal
+        """
+        self.connect(signals.config_reloaded)
+        ConfigModel.objects.create(key="char", value="bar")
+        set_version(111)
+        djconfig.register(BarForm)
+        djconfig.reload_maybe()
+        self.assertEqual(len(self.calls), 1)
+        self.assertIs(self.calls[0]['sender'], config)
+        self.assertEqual(self.calls[0]['version'], 111)
+        self.assertEqual(self.calls[0]['queries'], 1)
+        self.assertEqual(self.calls[0]['source'], 'full')
+        self.assertEqual(
+            sorted(self.calls[0]['keys']), ['_version', 'char'])
+        self.assertEqual(list(self.calls[0]['forms']), [BarForm])
+
+    def test_config_saved(self):
+        """
+        Should send the saved signal
+        """
+        self.connect(signals.config_saved)
+        djconfig.register(BarForm)
+        form = BarForm(data={"char": "foo2", })
+        self.assertTrue(form.is_valid())
+        form.save()
+        self.assertEqual(len(self.calls), 1)
+        self.assertIs(self.calls[0]['sender'], BarForm)
+        self.assertIs(self.calls[0]['form'], form)
+        self.assertEqual(self.calls[0]['keys'], ['char'])
+        self.assertEqual(self.calls[0]['version'], config._version)
+        self.assertGreater(self.calls[0]['queries'], 0)
+
+    @override_settings(DJCONFIG_CHECK_INTERVAL=60)
+    def test_config_stats(self):
+        """
+        Should count the checks, reloads and saves
+        """
+        djconfig.register(BarForm)
+        djconfig.reload_maybe()
+        djconfig.reload_maybe()
+        form = BarForm(data={"char": "foo2", })
+        self.assertTrue(form.is_valid())
+        form.save()
+        stats = djconfig.stats()
+        self.assertEqual(stats['checks'], 1)
+        self.assertEqual(stats['checks_db'], 1)
+        self.assertEqual(stats['checks_skipped'], 1)
+        self.assertEqual(stats['reloads'], 2)
+        self.assertEqual(stats['reloads_full'], 2)
+        self.assertEqual(stats['saves'], 1)
+        self.assertIn('reload_seconds', stats)
+        stats['saves'] = 0
+        self.assertEqual(djconfig.stats()['saves'], 1)
+
+
+TEST_CACHES = {
+    'good': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'bad': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+    }
+}
+
+
+@override_settings(CACHES=TEST_CACHES, DJCONFIG_CACHE='good')
+class DjConfigCacheTest(TestCase):
+
+    def setUp(self):
+        config._reset()
+        caches['good'].clear()
+
+    def test_config_cache_save(self):
+        """
+        Should store the last modified date in the cache on save
+        """
+        djconfig.register(BarForm)
+        form = BarForm(data={"char": "foo2", })
+        self.assertTrue(form.is_valid())
+        with self.captureOnCommitCallbacks(execute=True):
+            form.save()
+        self.assertEqual(
+            caches['good'].get(backends._CACHE_KEY),
+            ConfigVersion.objects.get(pk=1).version)
+
+    def test_config_cache_save_rollback(self):
+        """
+        Should not store the last modified\
+        date until the transaction is committed
+        """
+        djconfig.register(BarForm)
+        form = BarForm(data={"char": "foo2", })
+        self.assertTrue(form.is_valid())
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            form.save()
+        self.assertIsNone(caches['good'].get(backends._CACHE_KEY))
+        self.assertEqual(len(callbacks), 1)
+
+    def test_config_cache_populate(self):
+        """
+        Should not replace the cache with the database version
+        """
+        set_version(111)
+        caches['good'].set(backends._CACHE_KEY, 222)
+        self.assertEqual(config._get_version(), (222, False))
+        caches['good'].clear()
+        self.assertEqual(config._get_version(), (111, True))
+        backends.CacheBackend().set_version(222)
+        self.assertEqual(caches['good'].get(backends._CACHE_KEY), 111)
+
+    def test_config_cache_reload_maybe(self):
+        """
+        Should read the last modified date from the cache
+        """
+        djconfig.register(BarForm)
+        djconfig.reload_maybe()
+        self.assertEqual(config._version, 0)
+
+        with self.assertNumQueries(0):
+            djconfig.reload_maybe()
+
+        ConfigModel.objects.create(key="char", value="bar")
+        set_version(111)
+        with self.assertNumQueries(0):
+            djconfig.reload_maybe()
+        self.assertEqual(config.char, "foo")
+
+        caches['good'].set(backends._CACHE_KEY, 111)
+        djconfig.reload_maybe()
+        self.assertEqual(config.char, "bar")
+
+    def test_config_cache_fallback(self):
+        """
+        Should query the database on a cache miss\
+        and populate the cache
+        """
+        set_version(111)
+        djconfig.register(BarForm)
+        with self.assertNumQueries(2):
+            djconfig.reload_maybe()
+        self.assertEqual(config._version, 111)
+        self.assertEqual(caches['good'].get(backends._CACHE_KEY), 111)
+
+
+@override_settings(
+    CACHES=TEST_CACHES, DJCONFIG_CACHE='good', DJCONFIG_SNAPSHOT=True)
+class DjConfigSnapshotTest(TestCase):
+
+    def setUp(self):
+        config._reset()
+        caches['good'].clear()
+
+    def test_config_snapshot_save(self):
+        """
+        Should store a snapshot of the config on save
+        """
+        djconfig.register(BarForm)
+        form = BarForm(data={"char": "foo2", })
+        self.assertTrue(form.is_valid())
+        form.save()
+        snapshot = caches['good'].get(
+            config._snapshot_key(config._version))
+        self.assertEqual(snapshot, config._cache)
+        self.assertEqual(snapshot['char'], "foo2")
+
+    def test_config_snapshot_load(self):
+        """
+        Should load the snapshot instead of building the config
+        """
+        djconfig.register(BarForm)
+        form = BarForm(data={"char": "foo2", })
+        self.assertTrue(form.is_valid())
+        with self.captureOnCommitCallbacks(execute=True):
+            form.save()
+
+        # Another process
+        config._reset()
+        djconfig.register(BarForm)
+        ConfigModel.objects.filter(key="char").update(value="bar")
+        with self.assertNumQueries(0):
+            djconfig.reload_maybe()
+        self.assertEqual(config.char, "foo2")
+
+    def test_config_snapshot_missing(self):
+        """
+        Should build the config and store\
+        the snapshot if it's not found
+        """
+        ConfigModel.objects.create(key="char", value="bar")
+        set_version(111)
+        djconfig.register(BarForm)
+        djconfig.reload_maybe()
+        self.assertEqual(config.char, "bar")
+        self.assertEqual(
+            caches['good'].get(config._snapshot_key(111))['char'], "bar")
+
+    def test_config_snapshot_forms(self):
+        """
+        Should not load snapshots of a different set of forms
+        """
+        djconfig.register(BarForm)
+        key = config._snapshot_key(111)
+        djconfig.register(ModelChoiceForm)
+        self.assertNotEqual(config._snapshot_key(111), key)
+
+    def test_config_snapshot_fields(self):
+        """
+        Should not load snapshots of a different field definition
+        """
+        class RevForm(ConfigForm):
+            rev_char = forms.CharField(initial="old")
+
+        set_version(111)
+        djconfig.register(RevForm)
+        djconfig.reload_maybe()
+        self.assertEqual(config.rev_char, "old")
+        key = config._snapshot_key(111)
+        self.assertIsNotNone(caches['good'].get(key))
+
+        # Another process, after a deploy
+        class RevForm(ConfigForm):
+            rev_char = forms.CharField(initial="new")
+
+        config._reset()
+        djconfig.register(RevForm)
+        self.assertNotEqual(config._snapshot_key(111), key)
+        djconfig.reload_maybe()
+        self.assertEqual(config.rev_char, "new")
+
+
+class DjConfigSnapshotFileTest(TestCase):
+
+    def setUp(self):
+        config._reset()
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.path = os.path.join(self.dir, 'djconfig.snapshot')
+        settings_override = override_settings(
+            DJCONFIG_SNAPSHOT_FILE=self.path)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_config_snapshot_file_save(self):
+        """
+        Should write the snapshot file on save
+        """
+        djconfig.register(BarForm)
+        form = BarForm(data={"char": "foo2", })
+        self.assertTrue(form.is_valid())
+        form.save()
+        self.assertEqual(
+            conf._read_snapshot_file(
+                self.path, config._snapshot_key(config._version)),
+            config._cache)
+        self.assertIsNone(
+            conf._read_snapshot_file(
+                self.path, config._snapshot_key(111)))
+        self.assertEqual(
+            [name for name in os.listdir(self.dir)
+             if not name.endswith('.lock')],
+            ['djconfig.snapshot'])
+
+    def test_config_snapshot_file_load(self):
+        """
+        Should load the snapshot file instead of building the config
+        """
+        djconfig.register(BarForm)
+        form = BarForm(data={"char": "foo2", })
+        self.assertTrue(form.is_valid())
+        form.save()
+
+        # Another process
+        config._reset()
+        djconfig.register(BarForm)
+        ConfigModel.objects.filter(key="char").update(value="bar")
+        with self.assertNumQueries(1):
+            djconfig.reload_maybe()
+        self.assertEqual(config.char, "foo2")
+
+    def test_config_snapshot_file_fields(self):
+        """
+        Should not load the snapshot file\
+        of a different field definition
+        """
+        class RevForm(ConfigForm):
+            rev_char = forms.CharField(initial="old")
+
+        set_version(5)
+        djconfig.register(RevForm)
+        djconfig.reload_maybe()
+        self.assertEqual(config.rev_char, "old")
+        self.assertTrue(os.path.exists(self.path))
+
+        # After a deploy
+        class RevForm(ConfigForm):
+            rev_char = forms.CharField(initial="new")
+
+        config._reset()
+        djconfig.register(RevForm)
+        djconfig.reload_maybe()
+        self.assertEqual(config.rev_char, "new")
+
+    def test_config_snapshot_file_corrupted(self):
+        """
+        Should build the config if the file is corrupted
+        """
+        ConfigModel.objects.create(key="char", value="bar")
+        set_version(111)
+        djconfig.register(BarForm)
+        header = conf._SNAPSHOT_FILE_HEADER % config._snapshot_key(111)
+        with open(self.path, 'wb') as fh:
+            fh.write(header.encode('ascii') + b'corrupted')
+        djconfig.reload_maybe()
+        self.assertEqual(config.char, "bar")
+        self.assertEqual(
+            conf._read_snapshot_file(
+                self.path, config._snapshot_key(111))['char'],
+            "bar")
+
+    def test_config_snapshot_file_outdated(self):
+        """
+        Should build the config if the file\
+        refers to a missing class or module
+        """
+        ConfigModel.objects.create(key="char", value="bar")
+        set_version(111)
+        djconfig.register(BarForm)
+        header = conf._SNAPSHOT_FILE_HEADER % config._snapshot_key(111)
+        for payload in (
+                b'cdjconfig.conf\nMissingClass\n.',
+                b'cdjconfig_missing_module\nMissingClass\n.'):
+            with open(self.path, 'wb') as fh:
+                fh.write(header.encode('ascii') + payload)
+            with self.assertLogs('djconfig', 'WARNING'):
+                self.assertIsNone(conf._read_snapshot_file(
+                    self.path, config._snapshot_key(111)))
+        with self.assertLogs('djconfig', 'WARNING'):
+            djconfig.reload_maybe()
+        self.assertEqual(config.char, "bar")
+
+    def test_config_snapshot_file_empty(self):
+        """
+        Should build the config if the file is empty
+        """
+        open(self.path, 'wb').close()
+        djconfig.register(BarForm)
+        djconfig.reload_maybe()
+        self.assertEqual(config.char, "foo")
+
+
+class DjConfigVersionFileTest(TestCase):
+
+    def setUp(self):
+        config._reset()
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.path = os.path.join(self.dir, 'djconfig.version')
+        settings_override = override_settings(
+            DJCONFIG_VERSION_FILE=self.path)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def read(self):
+        with open(self.path) as fh:
+            return fh.read()
+
+    def test_config_version_file_save(self):
+        """
+        Should write the version file on save
+        """
+        djconfig.register(BarForm)
+        form = BarForm(data={"char": "foo2", })
+        self.assertTrue(form.is_valid())
+        with self.captureOnCommitCallbacks(execute=True):
+            form.save()
+        self.assertEqual(self.read(), str(config._version))
+
+    def test_config_version_file_reload_maybe(self):
+        """
+        Should read the version from the file
+        """
+        set_version(111)
+        djconfig.register(BarForm)
+        djconfig.reload_maybe()
+        self.assertEqual(self.read(), "111")
+
+        ConfigModel.objects.create(key="char", value="bar")
+        with self.assertNumQueries(0):
+            djconfig.reload_maybe()
+        self.assertEqual(config.char, "foo")
+
+        set_version(222)
+        backends._write_version_file(self.path, 222)
+        djconfig.reload_maybe()
+        self.assertEqual(config.char, "bar")
+        with self.assertNumQueries(0):
+            djconfig.reload_maybe()
+
+    def test_config_version_file_populate(self):
+        """
+        Should not replace the file with the database version
+        """
+        set_version(111)
+        backends._write_version_file(self.path, 222)
+        os.remove(self.path)
+        config._get_version()
+        self.assertEqual(self.read(), "111")
+        backends._write_version_file(self.path, 222, replace=False)
+        self.assertEqual(self.read(), "111")
+        self.assertEqual(os.listdir(self.dir), ['djconfig.version'])
+
+
+class DjConfigBackendsTest(TestCase):
+
+    def setUp(self):
+        config._reset()
+        self.addCleanup(config._reset)
+
+    def test_config_backends_default(self):
+        """
+        Should poll the database by default
+        """
+        self.assertEqual(
+            [type(b) for b in backends.get_backends()],
+            [backends.PollBackend])
+        with override_settings(
+                CACHES=TEST_CACHES,
+                DJCONFIG_CACHE='good',
+                DJCONFIG_VERSION_FILE='djconfig.version'):
+            self.assertEqual(
+                [type(b) for b in backends.get_backends()],
+                [backends.FileBackend,
+                 backends.CacheBackend,
+                 backends.PollBackend])
+
+    @override_settings(DJCONFIG_BACKENDS=['djconfig.backends.LocalBackend'])
+    def test_config_backends_setting(self):
+        """
+        Should add the poll backend at the end
+        """
+        self.assertEqual(
+            [type(b) for b in backends.get_backends()],
+            [backends.LocalBackend, backends.PollBackend])
+
+    @override_settings(DJCONFIG_BACKENDS=['djconfig.backends.LocalBackend'])
+    def test_config_backends_local(self):
+        """
+        Should query the database once
+        """
+        set_version(111)
+        djconfig.register(BarForm)
+        djconfig.reload_maybe()
+        self.assertEqual(config._version, 111)
+
+        set_version(222)
+        with self.assertNumQueries(0):
+            djconfig.reload_maybe()
+        self.assertEqual(config._version, 111)
+
+        form = BarForm(data={"char": "foo2", })
+        self.assertTrue(form.is_valid())
+        with self.captureOnCommitCallbacks(execute=True):
+            form.save()
+        with self.assertNumQueries(0):
+            djconfig.reload_maybe()
+        self.assertEqual(config.char, "foo2")
+
+    @override_settings(DJCONFIG_BACKENDS=['djconfig.backends.LocalBackend'])
+    def test_config_backends_setting_changed(self):
+        """
+        Should create the backends again on settings change
+        """
+        local_backends = config._get_backends()
+        self.assertIs(config._get_backends(), local_backends)
+        with override_settings(DJCONFIG_BACKENDS=[]):
+            self.assertEqual(
+                [type(b) for b in config._get_backends()],
+                [backends.PollBackend])
+
+    @override_settings(
+        DJCONFIG_BACKENDS=['djconfig.backends.NotifyBackend'],
+        DJCONFIG_NOTIFY_TRANSPORT='djconfig.backends.LocalTransport')
+    def test_config_backends_notify(self):
+        """
+        Should receive the version pushed by other processes
+        """
+        set_version(111)
+        djconfig.register(BarForm)
+        notify_backend = config._get_backends()[0]
+        notify_backend.get_version()
+        self.assertTrue(notify_backend._ready.wait(1))
+        with self.assertNumQueries(2):
+            djconfig.reload_maybe()
+        self.assertEqual(config._version, 111)
+        with self.assertNumQueries(0):
+            djconfig.reload_maybe()
+
+        # Another process
+        ConfigModel.objects.create(key="char", value="bar")
+        set_version(222)
+        other = backends.NotifyBackend()
+        self.addCleanup(other.stop)
+        other.publish(222)
+
+        for _ in range(100):
+            if notify_backend.get_version() == 222:
+                break
+            time.sleep(0.01)
+        djconfig.reload_maybe()
+        self.assertEqual(config.char, "bar")
+
+    @override_settings(
+        DJCONFIG_BACKENDS=['djconfig.backends.NotifyBackend'],
+        DJCONFIG_NOTIFY_TRANSPORT='djconfig.backends.LocalTransport')
+    def test_config_backends_notify_disconnect(self):
+        """
+        Should query the database while disconnected
+        """
+        set_version(111)
+        notify_backend = config._get_backends()[0]
+        notify_backend.get_version()
+        self.assertTrue(notify_backend._ready.wait(1))
+        self.assertEqual(config._get_version(), (111, True))
+        self.assertEqual(config._get_version(), (111, False))
+        notify_backend._ready.clear()
+        self.assertEqual(config._get_version(), (111, True))
+
+    @override_settings(
+        DJCONFIG_NOTIFY_TRANSPORT='djconfig.backends.LocalTransport')
+    def test_config_backends_notify_not_ready(self):
+        """
+        Should not keep a version read before listening
+        """
+        notify_backend = backends.NotifyBackend()
+        self.addCleanup(notify_backend.stop)
+        self.assertIsNone(notify_backend.get_version())
+        self.assertTrue(notify_backend._ready.wait(1))
+        # Read before listening, a notification may have been missed
+        notify_backend.set_version(5)
+        self.assertIsNone(notify_backend.get_version())
+        notify_backend.set_version(6)
+        self.assertEqual(notify_backend.get_version(), 6)
+
+        # Reconnected after the version was asked
+        notify_backend.version = None
+        self.assertIsNone(notify_backend.get_version())
+        notify_backend._set_ready()
+        notify_backend.set_version(7)
+        self.assertIsNone(notify_backend.get_version())
+
+    @override_settings(
+        DJCONFIG_NOTIFY_TRANSPORT='tests.tests.FailingTransport')
+    def test_config_backends_notify_error(self):
+        """
+        Should not wait for the listener, and\
+        reconnect on any listener error
+        """
+        notify_backend = backends.NotifyBackend()
+        notify_backend.retry_delay = 0
+        self.addCleanup(notify_backend.stop)
+        with self.assertLogs('djconfig', 'ERROR'):
+            self.assertIsNone(notify_backend.get_version())
+            self.assertTrue(notify_backend._ready.wait(1))
+        with self.assertLogs('djconfig', 'WARNING'):
+            notify_backend._received('not a version')
+        notify_backend._received('222')
+        self.assertEqual(notify_backend.get_version(), 222)
+
+    @override_settings(DJCONFIG_BACKENDS=['djconfig.backends.LocalBackend'])
+    def test_config_backends_async(self):
+        """
+        Should get the version from the backends
+        """
+        set_version(111)
+        self.assertEqual(
+            async_to_sync(config._aget_version)(), (111, True))
+        self.assertEqual(
+            async_to_sync(config._aget_version)(), (111, False))
+
+
+class FailingTransport(backends.LocalTransport):
+    """
+    Fail once, then listen
+    """
+    failed = False
+
+    def listen(self, callback, ready, stopped):
+        if not self.failed:
+            self.failed = True
+            raise ValueError('file descriptor cannot be a negative integer')
+        super(FailingTransport, self).listen(callback, ready, stopped)
+
+
+class DjConfigMiddlewareTest(TestCase):
+
+    def setUp(self):
+        config._reset()
+
+    def test_config_middleware_process_request(self):
+        """
+        config middleware, reload cache
+        """
+        ConfigModel.objects.create(key="char", value="foo")
+        djconfig.register(BarForm)
+        djconfig.reload_maybe()
+        config._set('char', None)
+
+        # Should not reload since the version is zero (form was not saved)
+        middleware = DjConfigMiddleware(get_response=lambda req: None)
+        middleware.process_request(request=RequestFactory().get('/'))
+        self.assertIsNone(config._cache.get('char'))
+
+        # Changing the version should make it reload
+        set_version(111)
+        middleware.process_request(request=RequestFactory().get('/'))
+        self.assertEqual(config._cache.get('char'), "foo")
+        self.assertEqual(config._cache.get("_version"), 111)
+
+        # It does not update again, since the version has not changed
+        ConfigModel.objects.filter(key="char").update(value="bar")
+        middleware.process_request(request=RequestFactory().get('/'))
+        self.assertNotEqual(config._cache.get('char'), "bar")
+        self.assertEqual(config._cache.get("_version"), 111)
+
+        # Changing the version should make it reload
+        set_version(222)
+        middleware.process_request(request=RequestFactory().get('/'))
+        self.assertEqual(config._cache.get('char'), "bar")
+        self.assertEqual(config._cache.get("_version"), 222)
+
+    async def test_config_middleware_async(self):
+        """
+        Should reload the config natively in async mode
+        """
+        async def request_handler(req):
+            return req
+
+        await sync_to_async(ConfigModel.objects.create)(key="char", value="bar")
+        await sync_to_async(djconfig.register)(BarForm)
+        mid = DjConfigMiddleware(request_handler)
+        request = RequestFactory().get('/')
+        self.assertEqual(await mid(request), request)
+        self.assertEqual(config.char, "bar")
+
+        await sync_to_async(set_version)(111)
+        await sync_to_async(ConfigModel.objects.filter(key="char").update)(value="baz")
+        self.assertEqual(await mid(request), request)
+        self.assertEqual(config.char, "baz")
+        self.assertEqual(config._version, 111)
+
+    @override_settings(DJCONFIG_PRELOAD=True)
+    def test_config_middleware_preload(self):
+        """
+        Should load the config on creation
+        """
+        djconfig.register(BarForm)
+        DjConfigMiddleware(lambda req: None)
+        self.assertEqual(config.char, "foo")
+
+    def test_config_middleware_request_config(self):
+        """
+        Should attach the frozen config to the request
+        """
+        djconfig.register(BarForm)
+        middleware = DjConfigMiddleware(lambda req: None)
+        request = RequestFactory().get('/')
+        middleware.process_request(request)
+        self.assertIs(request.djconfig, djconfig.frozen())
+        self.assertEqual(request.djconfig.char, "foo")
+
+        # Reloading does not change the request config
+        ConfigModel.objects.create(key="char", value="bar")
+        set_version(111)
+        other_request = RequestFactory().get('/')
+        middleware.process_request(other_request)
+        self.assertEqual(request.djconfig.char, "foo")
+        self.assertEqual(other_request.djconfig.char, "bar")
+
+    @override_settings(DJCONFIG_LAZY_CHECK=True)
+    def test_config_middleware_lazy_check(self):
+        """
+        Should check the version on first access, once per request
+        """
+        self.addCleanup(config._defer_check, False)
+        djconfig.register(BarForm)
+        djconfig.reload_maybe()
+        ConfigModel.objects.create(key="char", value="bar")
+        set_version(111)
+        middleware = DjConfigMiddleware(lambda req: None)
+        request = RequestFactory().get('/')
+        with self.assertNumQueries(0):
+            middleware(request)
+
+        request = RequestFactory().get('/')
+        middleware.process_request(request)
+        with self.assertNumQueries(2):
+            self.assertEqual(config.char, "bar")
+        with self.assertNumQueries(0):
+            self.assertEqual(config.char, "bar")
+            self.assertEqual(request.djconfig.char, "bar")
+        middleware.process_response(request, None)
+
+        set_version(222)
+        request = RequestFactory().get('/')
+        middleware.process_request(request)
+        with self.assertNumQueries(2):
+            self.assertEqual(request.djconfig.char, "bar")
+        with self.assertNumQueries(0):
+            self.assertEqual(config.char, "bar")
+        middleware.process_response(request, None)
+
+        # Outside requests
+        with self.assertNumQueries(0):
+            self.assertEqual(config.char, "bar")
+
+    def test_config_middleware_lazy_check_access(self):
+        """
+        Should not look for a deferred check on\
+        access unless the check is deferred
+        """
+        djconfig.register(BarForm)
+        djconfig.reload_maybe()
+        DjConfigMiddleware(lambda req: None)
+        self.assertFalse(config._lazy_check)
+        with mock.patch.object(
+                config, '_check_deferred', side_effect=AssertionError):
+            self.assertEqual(config.char, "foo")
+        with override_settings(DJCONFIG_LAZY_CHECK=True):
+            DjConfigMiddleware(lambda req: None)
+        self.assertTrue(config._lazy_check)
+
+    @override_settings(DJCONFIG_EXCLUDE_PATHS=[r'^/health/', r'^/metrics$'])
+    def test_config_middleware_exclude_paths(self):
+        """
+        Should skip the matching requests
+        """
+        djconfig.register(BarForm)
+        middleware = DjConfigMiddleware(lambda req: None)
+        request = RequestFactory().get('/health/db')
+        with self.assertNumQueries(0):
+            middleware(request)
+        self.assertFalse(hasattr(request, 'djconfig'))
+        with self.assertNumQueries(0):
+            middleware(RequestFactory().get('/metrics'))
+        with self.assertNumQueries(2):
+            middleware(RequestFactory().get('/metrics/foo'))
+
+    @override_settings(DJCONFIG_EXCLUDE_PATHS=[r'^/health/'])
+    async def test_config_middleware_exclude_paths_async(self):
+        """
+        Should skip the matching requests
+        """
+        async def request_handler(req):
+            return req
+
+        await sync_to_async(djconfig.register)(BarForm)
+        middleware = DjConfigMiddleware(request_handler)
+        request = RequestFactory().get('/health/')
+        self.assertIs(await middleware(request), request)
+        self.assertFalse(hasattr(request, 'djconfig'))
+        self.assertRaises(AttributeError, lambda: config.char)
+
+    def test_config_context_processor(self):
+        """
+        Should use the request config, if any
+        """
+        djconfig.register(BarForm)
+        request = RequestFactory().get('/')
+        self.assertIs(context_processors.config(request)['config'], config)
+        DjConfigMiddleware(lambda req: None).process_request(request)
+        self.assertIs(
+            context_processors.config(request)['config'], request.djconfig)
+
+    def test_config_middleware_no_preload(self):
+        """
+        Should not load the config on creation by default
+        """
+        djconfig.register(BarForm)
+        DjConfigMiddleware(lambda req: None)
+        self.assertRaises(AttributeError, lambda: config.char)
+
+    @override_settings(DJCONFIG_REFRESH_INTERVAL=60)
+    def test_config_middleware_refresher(self):
+        """
+        Should not check the version once\
+        loaded, while the refresher is running
+        """
+        self.addCleanup(config._reset)
+        djconfig.register(BarForm)
+        middleware = DjConfigMiddleware(lambda req: None)
+        self.assertIsNotNone(config._refresher)
+        with self.assertNumQueries(2):
+            middleware.process_request(RequestFactory().get('/'))
+        self.assertEqual(config.char, "foo")
+        set_version(111)
+        with self.assertNumQueries(0):
+            middleware.process_request(RequestFactory().get('/'))
+        self.assertEqual(config.char, "foo")
+
+        config._stop_refresher()
+        with self.assertNumQueries(2):
+            middleware.process_request(RequestFactory().get('/'))
+
+    @override_settings(DJCONFIG_REFRESH_INTERVAL=0.01)
+    def test_config_refresher(self):
+        """
+        Should check the version in the background
+        """
+        self.addCleanup(config._reset)
+        checked = threading.Event()
+        with mock.patch.object(
+                config, '_reload_maybe',
+                side_effect=lambda force: checked.set()) as reload_maybe:
+            self.assertTrue(config._start_refresher())
+            self.assertTrue(checked.wait(5))
+            config._stop_refresher()
+        reload_maybe.assert_called_with(force=True)
+
+    @override_settings(DJCONFIG_REFRESH_INTERVAL=0.01)
+    def test_config_refresher_error(self):
+        """
+        Should keep running on errors
+        """
+        self.addCleanup(config._reset)
+        checked = threading.Semaphore(0)
+
+        def reload_maybe(force):
+            checked.release()
+            raise DatabaseError('foo')
+
+        with mock.patch.object(config, '_reload_maybe', reload_maybe), \
+                mock.patch.object(conf.logger, 'exception'):
+            config._start_refresher()
+            self.assertTrue(checked.acquire(timeout=5))
+            self.assertTrue(checked.acquire(timeout=5))
+            config._stop_refresher()
+
+    def test_config_refresher_not_set(self):
+        """
+        Should not start the refresher by default
+        """
+        self.assertFalse(config._start_refresher())
+        self.assertIsNone(config._refresher)
+
+    @override_settings(DJCONFIG_REFRESH_INTERVAL=60)
+    def test_config_refresher_after_fork(self):
+        """
+        Should start the refresher again in the child
+        """
+        self.addCleanup(config._reset)
+        config._start_refresher()
+        thread, stopped = config._refresher
+        self.addCleanup(stopped.set)
+        config._after_fork()
+        self.assertIsNot(config._refresher[0], thread)
+        self.assertTrue(config._refresher[0].is_alive())
 
     def test_config_middleware_old(self):
         """
@@ -552,7 +2376,8 @@ class DjConfigMiddlewareTest(TestCase):
             return req
 
         mid = DjConfigMiddleware(request_handler)
-        self.assertEqual(mid('foo'), 'foo')
+        request = RequestFactory().get('/')
+        self.assertEqual(mid(request), request)
 
 
 class DjConfigUtilsTest(TestCase):